@@ -1,7 +1,17 @@
 import os
+import sys
 import streamlit as st
-import pandas as pd
-import psycopg2
+
+# The shared data layer lives with the v1 app
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'NFL_Bets_Tracker_v1'))
+from bets_data import load_pending_bets
+from db import get_database
+from diagnostics import show_diagnostics
+from profiling import start_run, timed
+from risk import pending_risk
+from simulation import SIM_BANKROLL, SIM_TRIALS, expert_edges, simulate_slate, simulation_figure
+from summary_queries import expert_season_summary, expert_table, season_totals
+from warmup import page_imported, start_warmup
 
 
 
@@ -13,56 +23,96 @@ if not DATABASE_URL:
     st.error("DATABASE_URL environment variable not set.")
     st.stop()
 
-# Connect to PostgreSQL database (or create it)
+# Shared database connection pool (backend picked from the DATABASE_URL scheme)
 try:
-    conn = sqlite3.connect(DATABASE_URL)
-    c = conn.cursor()
+    db = get_database(DATABASE_URL)
 except Exception as e:
     st.error(f"Failed to connect to the database: {e}")
     st.stop()
 
+# Hidden diagnostics view (add ?diagnostics to the URL); timings are only recorded when BETS_PROFILING is set
+if 'diagnostics' in st.query_params:
+    show_diagnostics()
+    st.stop()
+start_run('Summary')
+page_imported('Summary')
+
+def format_currency(amount):
+    """Format a number as currency."""
+    return '${:,.2f}'.format(float(amount))
+
 # Title of the summary page
 st.title("Bets Summary")
 
-# Load data function
-def load_data():
-    # Load bets into DataFrame
-    bets_df = pd.read_sql('SELECT * FROM bets', conn)
-    return bets_df
-
-# Load the bets data
-bets_df = load_data()
+# Per-expert, per-season totals from the rollup table (cached until the bets table changes)
+summary_df = expert_season_summary(db)
+totals = season_totals(summary_df)
 
 # Calculate total bets
-total_bets = len(bets_df)
-st.write(f"Total Bets: {total_bets}")
+st.write(f"Total Bets: {int(totals['total_bets'])}")
 
 # Calculate total wins and losses
-won_bets = len(bets_df[bets_df["outcome"] == "Won"])
-lost_bets = len(bets_df[bets_df["outcome"] == "Lost"])
-st.write(f"Total Wins: {won_bets}")
-st.write(f"Total Losses: {lost_bets}")
+st.write(f"Total Wins: {int(totals['won_bets'])}")
+st.write(f"Total Losses: {int(totals['lost_bets'])}")
 
 # Calculate win percentage
-win_percentage = (won_bets / total_bets * 100) if total_bets > 0 else 0
-st.write(f"Win Percentage: {win_percentage:.2f}%")
+st.write(f"Win Percentage: {totals['win_percentage']:.2f}%")
 
 # Show number of pending bets
-pending_bets = bets_df[bets_df["outcome"] == "Pending"]
-st.write(f"Total Pending Bets: {len(pending_bets)}")
+st.write(f"Total Pending Bets: {int(totals['pending_bets'])}")
+
+# Worst and best case of the open bets; Overs and Unders on the same line can't both lose
+st.subheader("Pending Exposure", divider=True)
+with timed('transform', 'pending_risk') as span:
+    pending_bets = load_pending_bets(db)
+    span.rows = len(pending_bets)
+    risk = pending_risk(pending_bets)
+if risk is None:
+    st.write("No pending bets.")
+else:
+    col1, col2, col3 = st.columns(3)
+    col1.metric("Pending Units Wagered", format_currency(risk['totals']['at_risk']))
+    col2.metric("Max Win", format_currency(risk['totals']['max_win']))
+    col3.metric("Max Loss", format_currency(risk['totals']['max_loss']))
+    with timed('render', 'pending exposure'):
+        st.dataframe(risk['by_expert'], width=1000)
+        with st.expander("By Week and Pick"):
+            st.dataframe(risk['by_week'], width=1000)
+            st.dataframe(risk['by_pick'], width=1000)
+        with st.expander("Net Position by Side"):
+            st.dataframe(risk['sides'], width=1000)
+        with st.expander("Exposure by Expert, Pick and Type"):
+            st.dataframe(risk['matrix'], hide_index=True, width=1000)
+
+    # Random settlements of the open slate; run on request since it takes a second or two
+    st.subheader("Simulated Slate", divider=True)
+    with st.form(key='simulation_form'):
+        col1, col2 = st.columns(2)
+        bankroll = col1.number_input("Bankroll per Expert", min_value=1.0, value=SIM_BANKROLL, step=50.0)
+        use_hit_rates = col2.checkbox("Adjust for each expert's hit rate", value=True)
+        simulate = st.form_submit_button(f"Simulate {SIM_TRIALS:,} Slates")
+    if simulate:
+        with timed('transform', 'simulate_slate') as span:
+            span.rows = len(pending_bets)
+            edges = expert_edges(expert_season_summary(db)) if use_hit_rates else None
+            simulation = simulate_slate(pending_bets, edges, bankroll)
+        group = simulation['group']
+        col1, col2, col3, col4 = st.columns(4)
+        col1.metric("Median", format_currency(group['P50']))
+        col2.metric("5th to 95th Percentile", f"{format_currency(group['P5'])} to {format_currency(group['P95'])}")
+        col3.metric("Losing Slate", f"{group['Losing %']:.1f}%")
+        col4.metric("Risk of Ruin", f"{group['Ruin %']:.2f}%")
+        with timed('render', 'simulation'):
+            st.plotly_chart(simulation_figure(simulation), use_container_width=True)
+            st.dataframe(simulation['by_expert'], width=1000)
+        st.caption(f"{simulation['trials']:,} trials in {simulation['seconds']:.1f}s")
 
 # Display summary of bets by expert
 st.subheader("Bets by Expert")
-# Aggregate the bets data
-expert_summary = bets_df.groupby('expert').agg({
-    'id': 'count', 
-    'Dollars': 'sum', 
-    'outcome': lambda x: (x == 'Won').sum(),  # Count won bets
-}).rename(columns={'id': 'Total Bets', 'Dollars': 'Dollars Gained', 'outcome': 'Won Bets'})
-# Add Lost Bets and Win Percentage to the summary
-expert_summary['Lost Bets'] = expert_summary['Total Bets'] - expert_summary['Won Bets']
-expert_summary['Win Percentage'] = (expert_summary['Won Bets'] / expert_summary['Total Bets'] * 100).fillna(0)
-# Reorder columns
-expert_summary = expert_summary[['Total Bets', 'Won Bets', 'Lost Bets', 'Win Percentage', 'Dollars Gained']]
-# Display the expert summary
-st.write(expert_summary)
\ No newline at end of file
+with timed('transform', 'expert_table'):
+    expert_summary = expert_table(summary_df)
+with timed('render', 'expert table'):
+    st.write(expert_summary)
+
+# Load the chart libraries and build the chart pages' data in the background, now that this page is up
+start_warmup(db)
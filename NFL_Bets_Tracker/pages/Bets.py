@@ -1,7 +1,19 @@
+import datetime
 import os
+import sys
 import streamlit as st
-import pandas as pd
-import psycopg2
+
+# The shared data layer lives with the v1 app
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), 'NFL_Bets_Tracker_v1'))
+from bets_data import (
+    COMPLETED_OUTCOMES, PENDING_REFRESH_SECONDS, add_bet, bet_labels, load_completed_page, load_pending_bets,
+    search_pending_bets, settle_bet, settle_bets,
+)
+from db import get_database
+from profiling import start_run, timed
+from payouts import bet_dollars
+from summary_queries import expert_season_summary, type_season_summary
+from writer import write
 
 # Fetch the DATABASE_URL from environment variables
 DATABASE_URL = os.getenv('DATABASE_URL')
@@ -11,47 +23,22 @@ if not DATABASE_URL:
     st.error("DATABASE_URL environment variable not set.")
     st.stop()
 
-# Connect to PostgreSQL database (or create it)
+# Shared database connection pool (backend picked from the DATABASE_URL scheme)
 try:
-    conn = psycopg2.connect(DATABASE_URL, sslmode='require')
-    c = conn.cursor()
+    db = get_database(DATABASE_URL)
 except Exception as e:
     st.error(f"Failed to connect to the database: {e}")
     st.stop()
 
-# Create bets table if it doesn't exist
-c.execute('''
-CREATE TABLE IF NOT EXISTS bets (
-    id SERIAL PRIMARY KEY,
-    date DATE,
-    week INTEGER,
-    expert TEXT,
-    pick_type TEXT,
-    pick_answer TEXT,
-    bet_type TEXT,
-    bet_side TEXT,
-    wager NUMERIC,
-    odds NUMERIC,
-    outcome TEXT,
-    dollars NUMERIC
-)
-''')
-conn.commit()
+# The bets table, its indexes and bookkeeping are created by bets_data on first use
+
+start_run('Bets')
 
 # Title of the app
 st.title("Bets Tracker")
 
-# Load data function
-def load_data():
-    # Load bets into DataFrame
-    bets_df = pd.read_sql('SELECT * FROM bets', conn)
-    return bets_df
-
-# Load the bets data initially
-bets_df = load_data()
-
-# Filter bets into Pending and Completed (Won/Lost)
-pending_bets = bets_df[bets_df["outcome"] == "Pending"]
+# Load the pending bets initially (indexed lookup, cached until the bets table changes)
+pending_bets = load_pending_bets(db)
 
 # Create tabs
 tab1, tab2 = st.tabs(["Pending Bets", "Completed Bets"])
@@ -78,25 +65,15 @@ with tab1:
             submit = st.form_submit_button("Add Bet")
 
             if submit:
-                # Calculate dollars based on odds
-                if odds > 1:
-                    dollars = (((odds / 100) + 1) * 100) * wager
-                elif odds < 1:
-                    dollars = (((100 / odds) + 1) * 100) * wager
-                else:
-                    dollars = wager
+                # Potential profit while pending, profit/loss once settled
+                dollars = bet_dollars([outcome], [wager], [odds])[0]
 
-                # Add new bet to the PostgreSQL database
+                # Add new bet to the PostgreSQL database (through the shared writer; returns once committed)
                 try:
-                    c.execute('''
-                        INSERT INTO bets (date, week, expert, pick_type, pick_answer, bet_type, bet_side, wager, odds, outcome, dollars)
-                        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-                    ''', (bet_date, week_no, bettor, pick_type, pick_answer, bet_type, bet_side, wager, odds, outcome, dollars))
-                    conn.commit()
+                    write(db, add_bet, (bet_date, week_no, bettor, pick_type, pick_answer, bet_type, bet_side, wager, odds, outcome, dollars))
                     st.success("Bet added!")
                     # Reload data after adding a new bet
-                    bets_df = load_data()
-                    pending_bets = bets_df[bets_df["outcome"] == "Pending"]
+                    pending_bets = load_pending_bets(db)
                 except Exception as e:
                     st.error(f"Failed to add bet: {e}")
 
@@ -104,39 +81,98 @@ with tab1:
     if not pending_bets.empty:
         with st.expander("Update Pending Bets"):
             st.subheader("Edit Pending Bets")
+            # Matching is done in SQL; the picker formats options from a prebuilt id -> label map
+            search = st.text_input("Search pending bets (expert, pick, type or week)")
+            matching_bets = search_pending_bets(db, search)
+            pending_labels = bet_labels(matching_bets)
             bet_to_edit = st.selectbox(
                 "Select a Bet to Update", 
-                pending_bets['id'], 
-                format_func=lambda x: f"{pending_bets.loc[pending_bets['id'] == x, 'pick_answer'].values[0]} ({pending_bets.loc[pending_bets['id'] == x, 'bet_type'].values[0]})"
+                list(pending_labels), 
+                format_func=pending_labels.get
             )
 
             # Update the selected bet's outcome
-            new_outcome = st.selectbox("Update Outcome", ["Won", "Lost"])
+            new_outcome = st.selectbox("Update Outcome", ["Won", "Lost", "Push"])
             update = st.button("Update Bet")
 
-            if update:
+            if update and bet_to_edit is not None:
                 # Determine new dollars value based on outcome
-                if new_outcome == "Lost":
-                    new_dollars = -pending_bets.loc[pending_bets['id'] == bet_to_edit, 'wager'].values[0]
-                else:
-                    new_dollars = pending_bets.loc[pending_bets['id'] == bet_to_edit, 'dollars'].values[0]
+                bet_row = matching_bets[matching_bets['id'] == bet_to_edit]
+                new_dollars = bet_dollars([new_outcome], bet_row['Wager'], bet_row['Odds'])[0]
 
                 try:
-                    c.execute('UPDATE bets SET outcome = %s, dollars = %s WHERE id = %s', (new_outcome, new_dollars, bet_to_edit))
-                    conn.commit()
+                    write(db, settle_bet, bet_to_edit, new_outcome, new_dollars)
                     st.success(f"Bet updated to {new_outcome}!")
                     # Reload the data after updating
-                    bets_df = load_data()
-                    pending_bets = bets_df[bets_df["outcome"] == "Pending"]
+                    pending_bets = load_pending_bets(db)
                 except Exception as e:
                     st.error(f"Failed to update bet: {e}")
 
-    # Display Pending Bets at the top
+        # Settle many bets at once: edits stay in the form until it's submitted,
+        # then every change is written in one transaction
+        with st.expander("Settle Pending Bets in Bulk"):
+            with st.form(key='bulk_settle_form'):
+                settle_df = pending_bets[['id', 'Week', 'Expert', 'Pick', 'Type', 'Side', 'Wager', 'Odds', 'Dollars']].assign(Outcome='Pending')
+                edited_df = st.data_editor(
+                    settle_df,
+                    column_config={'Outcome': st.column_config.SelectboxColumn("Outcome", options=['Pending', 'Won', 'Lost', 'Push'], required=True)},
+                    disabled=[col for col in settle_df.columns if col != 'Outcome'],
+                    hide_index=True,
+                    width=1000,
+                )
+                settle = st.form_submit_button("Settle Bets")
+
+            if settle:
+                settled = edited_df[edited_df['Outcome'] != 'Pending']
+                if settled.empty:
+                    st.info("No outcomes were changed.")
+                else:
+                    dollars = bet_dollars(settled['Outcome'], settled['Wager'], settled['Odds'])
+                    try:
+                        count = write(db, settle_bets, list(zip(settled['id'], settled['Outcome'], dollars)))
+                        st.success(f"Settled {count} bets!")
+                        # Reload the data once for the whole batch
+                        pending_bets = load_pending_bets(db)
+                    except Exception as e:
+                        st.error(f"Failed to settle bets: {e}")
+
+    # Display Pending Bets at the top; the table refreshes itself when another user adds or settles a bet
     st.subheader("Pending Bets")
-    st.dataframe(pending_bets, width=1000) 
+
+    @st.fragment(run_every=PENDING_REFRESH_SECONDS)
+    def pending_table():
+        pending_bets = load_pending_bets(db)
+        with timed('render', 'pending bets table') as span:
+            span.rows = len(pending_bets)
+            st.dataframe(pending_bets, width=1000)
+
+    pending_table()
 
 with tab2:
-    completed_bets = bets_df[bets_df["outcome"].isin(["Won", "Lost"])]
-    # Display Completed Bets in a separate tab
     st.subheader("Completed Bets")
-    st.dataframe(completed_bets, width=1000)
\ No newline at end of file
+    # The date window and filters are applied in SQL, and only one page of rows is read per rerun
+    today = datetime.date.today()
+    filter_col1, filter_col2, filter_col3 = st.columns(3)
+    date_window = filter_col1.date_input("Dates", (today - datetime.timedelta(days=10), today))
+    experts = filter_col2.multiselect("Expert", sorted(name for name in expert_season_summary(db)['Expert'].unique() if name))
+    types = filter_col3.multiselect("Bet Type", sorted(name for name in type_season_summary(db)['Type'].unique() if name))
+    outcomes = filter_col1.multiselect("Outcome", COMPLETED_OUTCOMES, default=['Won', 'Lost'])
+    page_size = filter_col2.selectbox("Rows per page", [25, 50, 100, 250], index=1)
+    start_date, end_date = (tuple(date_window) + (None, None))[:2]
+
+    # Cursors of the pages visited so far; changing a filter starts again from the first page
+    filters = (start_date, end_date, tuple(experts), tuple(types), tuple(outcomes), page_size)
+    if st.session_state.get('completed_filters') != filters:
+        st.session_state['completed_filters'] = filters
+        st.session_state['completed_cursors'] = [None]
+    cursors = st.session_state['completed_cursors']
+
+    completed_bets, next_cursor = load_completed_page(db, start_date, end_date, experts, types, outcomes, cursors[-1], page_size)
+    with timed('render', 'completed bets table') as span:
+        span.rows = len(completed_bets)
+        st.dataframe(completed_bets, width=1000)
+
+    prev_col, page_col, next_col = st.columns(3)
+    prev_col.button("Previous Page", disabled=len(cursors) == 1, on_click=cursors.pop)
+    page_col.write(f"Page {len(cursors)}")
+    next_col.button("Next Page", disabled=next_cursor is None, on_click=cursors.append, args=(next_cursor,))
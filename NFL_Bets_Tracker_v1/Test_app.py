@@ -1,7 +1,14 @@
 import os
 import streamlit as st
-import pandas as pd
-import sqlite3
+from bets_data import load_pending_bets
+from db import get_database
+from diagnostics import show_diagnostics
+from profiling import start_run, timed
+from risk import pending_risk
+from seasons import current_season
+from simulation import SIM_BANKROLL, SIM_TRIALS, expert_edges, simulate_slate, simulation_figure
+from summary_queries import expert_season_summary, expert_table, season_totals
+from warmup import page_imported, start_warmup
 
 # Fetch the DATABASE_URL from environment variables
 DATABASE_URL = os.getenv('DATABASE_URL', 'C:/Users/sethmiller_ryanlawn/OneDrive - Ryan Lawn and Tree/Desktop/Home/NFL/NFL_Bets_Tracker_v1/test_db.sqlite')
@@ -11,13 +18,20 @@ if not DATABASE_URL:
     st.error("DATABASE_URL environment variable not set.")
     st.stop()
 
+# Shared, process-wide database connection
 try:
-    conn = sqlite3.connect(DATABASE_URL)
-    c = conn.cursor()
+    db = get_database(DATABASE_URL)
 except Exception as e:
     st.error(f"Failed to connect to the database: {e}")
     st.stop()
 
+# Hidden diagnostics view (add ?diagnostics to the URL); timings are only recorded when BETS_PROFILING is set
+if 'diagnostics' in st.query_params:
+    show_diagnostics()
+    st.stop()
+start_run('Test_app')
+page_imported('Test_app')
+
 def format_currency(amount):
     """Format a number as currency."""
     try:
@@ -29,109 +43,98 @@ def format_currency(amount):
 # Title of the summary page
 st.title("Bets Summary")
 
-# Load data function
-def load_data():
-    # Load bets into DataFrame
-    bets_df = pd.read_sql('SELECT * FROM bets', conn)
-    return bets_df
-
-# Load the bets data
-bets_df = load_data()
-current_bets_df = bets_df[bets_df['Date'] >= '2024-08-01']
-if current_bets_df.empty:
-    st.write("No 2024 bets data available.")
+# Per-expert, per-season totals from the rollup table (cached until the bets table changes)
+summary_df = expert_season_summary(db)
+season = current_season()
+current_summary_df = summary_df[summary_df['season'] == season]
+if current_summary_df.empty:
+    st.write(f"No {season} bets data available.")
 else:
-    # Calculate total bets
-    total_bets = len(current_bets_df)
-    #st.write(f"Total Bets: {total_bets}")
-
-    # Calculate total wins and losses
-    won_bets = len(current_bets_df[current_bets_df["Outcome"] == "Won"])
-    lost_bets = len(current_bets_df[current_bets_df["Outcome"] == "Lost"])
-    #st.write(f"Total Wins: {won_bets}")
-    #st.write(f"Total Losses: {lost_bets}")
-
-    # Calculate win percentage
-    win_percentage = (won_bets / total_bets * 100) if total_bets > 0 else 0
-    #st.write(f"Win Percentage: {win_percentage:.2f}%")
-
-    
-    # Calculate total dollars gained
-    completed_bets = current_bets_df[current_bets_df["Outcome"].isin(["Won", "Lost"])]
-    # Ensure 'dollars' and 'wager' columns are numeric
-    completed_bets['Dollars'] = pd.to_numeric(completed_bets['Dollars'], errors='coerce')
-    completed_bets['Wager'] = pd.to_numeric(completed_bets['Wager'], errors='coerce')
-
-    dollars_won = completed_bets['Dollars'].sum()
-    dollars_wagered = completed_bets['Wager'].sum()
-
-    roi = (dollars_won / dollars_wagered * 100) if dollars_wagered > 0 else 0
-    #st.write(f"Possible Profit Gained: {format_currency(completed_bets['dollars'].sum())}")
-    #st.write(f"Possible Profit Gained: {roi:.2f}%")
-    #st.write(f"Possible Profit Gained: {format_currency(dollars_wagered)}")
-
-    
+    totals = season_totals(summary_df, season)
 
     # Display statistics in the first column
 
     st.subheader("Bet Counts", divider=True)
-    st.write(f"Total Bets: {total_bets}")
-    st.write(f"Total Wins: {won_bets}")
-    st.write(f"Total Losses: {lost_bets}")
-    st.write(f"Win Percentage: {win_percentage:.2f}%")
+    st.write(f"Total Bets: {int(totals['total_bets'])}")
+    st.write(f"Total Wins: {int(totals['won_bets'])}")
+    st.write(f"Total Losses: {int(totals['lost_bets'])}")
+    st.write(f"Win Percentage: {totals['win_percentage']:.2f}%")
 
     # Display statistics in the second column
 
     st.subheader("Dollars and ROI", divider=True)
-    st.write(f"Possible Profit Gained: {format_currency(dollars_won)}")
-    st.write(f"Total Dollars Wagered: {format_currency(dollars_wagered)}")
-    st.write(f"Return on Investment (ROI): {roi:.2f}%")
+    st.write(f"Possible Profit Gained: {format_currency(totals['dollars'])}")
+    st.write(f"Total Dollars Wagered: {format_currency(totals['wagered'])}")
+    st.write(f"Return on Investment (ROI): {totals['roi']:.2f}%")
 
     st.subheader("Pending Stats", divider=True)
-    # Show number of pending bets
-    pending_bets = bets_df[bets_df["Outcome"] == "Pending"]
-    st.write(f"Total Pending Bets: {len(pending_bets)}")
-    st.write(f"Pending Units Wagered: {format_currency(pending_bets['Wager'].sum())}")
-    st.write(f"Possible Profit Gained: {format_currency(pending_bets['Dollars'].sum())}")
+    # Pending bets across every season
+    pending_totals = season_totals(summary_df)
+    st.write(f"Total Pending Bets: {int(pending_totals['pending_bets'])}")
+    st.write(f"Pending Units Wagered: {format_currency(pending_totals['pending_wagered'])}")
+    st.write(f"Possible Profit Gained: {format_currency(pending_totals['pending_dollars'])}")
+
+# Worst and best case of the open bets; Overs and Unders on the same line can't both lose
+st.subheader("Pending Exposure", divider=True)
+with timed('transform', 'pending_risk') as span:
+    pending_bets = load_pending_bets(db)
+    span.rows = len(pending_bets)
+    risk = pending_risk(pending_bets)
+if risk is None:
+    st.write("No pending bets.")
+else:
+    col1, col2, col3 = st.columns(3)
+    col1.metric("Pending Units Wagered", format_currency(risk['totals']['at_risk']))
+    col2.metric("Max Win", format_currency(risk['totals']['max_win']))
+    col3.metric("Max Loss", format_currency(risk['totals']['max_loss']))
+    with timed('render', 'pending exposure'):
+        st.dataframe(risk['by_expert'], width=1000)
+        with st.expander("By Week and Pick"):
+            st.dataframe(risk['by_week'], width=1000)
+            st.dataframe(risk['by_pick'], width=1000)
+        with st.expander("Net Position by Side"):
+            st.dataframe(risk['sides'], width=1000)
+        with st.expander("Exposure by Expert, Pick and Type"):
+            st.dataframe(risk['matrix'], hide_index=True, width=1000)
+
+    # Random settlements of the open slate; run on request since it takes a second or two
+    st.subheader("Simulated Slate", divider=True)
+    with st.form(key='simulation_form'):
+        col1, col2 = st.columns(2)
+        bankroll = col1.number_input("Bankroll per Expert", min_value=1.0, value=SIM_BANKROLL, step=50.0)
+        use_hit_rates = col2.checkbox("Adjust for each expert's hit rate", value=True)
+        simulate = st.form_submit_button(f"Simulate {SIM_TRIALS:,} Slates")
+    if simulate:
+        with timed('transform', 'simulate_slate') as span:
+            span.rows = len(pending_bets)
+            edges = expert_edges(expert_season_summary(db)) if use_hit_rates else None
+            simulation = simulate_slate(pending_bets, edges, bankroll)
+        group = simulation['group']
+        col1, col2, col3, col4 = st.columns(4)
+        col1.metric("Median", format_currency(group['P50']))
+        col2.metric("5th to 95th Percentile", f"{format_currency(group['P5'])} to {format_currency(group['P95'])}")
+        col3.metric("Losing Slate", f"{group['Losing %']:.1f}%")
+        col4.metric("Risk of Ruin", f"{group['Ruin %']:.2f}%")
+        with timed('render', 'simulation'):
+            st.plotly_chart(simulation_figure(simulation), use_container_width=True)
+            st.dataframe(simulation['by_expert'], width=1000)
+        st.caption(f"{simulation['trials']:,} trials in {simulation['seconds']:.1f}s")
 
-    
 st.subheader("Bets by Expert (Current NFL Season)", divider=True)
 
-# Aggregate the bets data
-expert_summary_current = current_bets_df.groupby('Expert').agg({
-    'id': 'count', 
-    'Dollars': 'sum', 
-    'Outcome': lambda x: (x == 'Won').sum(),  # Count won bets
-}).rename(columns={'id': 'Total Bets', 'Dollars': 'Dollars Gained', 'Outcome': 'Won Bets'})
-
-# Add Lost Bets and Win Percentage to the summary
-expert_summary_current['Lost Bets'] = expert_summary_current['Total Bets'] - expert_summary_current['Won Bets']
-expert_summary_current['Win Percentage'] = ((expert_summary_current['Won Bets'] / expert_summary_current['Total Bets'] * 100).fillna(0)).apply(lambda x: f"{x:.2f}%")
-
-# Reorder columns
-expert_summary_current = expert_summary_current[['Total Bets', 'Won Bets', 'Lost Bets', 'Win Percentage', 'Dollars Gained']]
-
 # Display the expert summary for current bets
-st.write(expert_summary_current)
+with timed('transform', 'expert_table (current season)'):
+    current_table = expert_table(summary_df, season)
+with timed('render', 'expert table (current season)'):
+    st.write(current_table)
 
 st.subheader("Bets by Expert (Last NFL Season)", divider=True)
-# Filter for bets placed before 08/01/2024
-prior_bets_df = bets_df[bets_df['Date'] < '2024-08-01']
-# Aggregate the bets data
-expert_summary_prior = prior_bets_df.groupby('Expert').agg({
-    'id': 'count', 
-    'Dollars': 'sum', 
-    'Outcome': lambda x: (x == 'Won').sum(),  # Count won bets
-}).rename(columns={'id': 'Total Bets', 'Dollars': 'Dollars Gained', 'Outcome': 'Won Bets'})
-
-# Add Lost Bets and Win Percentage to the summary
-expert_summary_prior['Lost Bets'] = expert_summary_prior['Total Bets'] - expert_summary_prior['Won Bets']
-expert_summary_prior['Win Percentage'] = ((expert_summary_prior['Won Bets'] / expert_summary_prior['Total Bets'] * 100).fillna(0)).apply(lambda x: f"{x:.2f}%")
-
-# Reorder columns
-expert_summary_prior = expert_summary_prior[['Total Bets', 'Won Bets', 'Lost Bets', 'Win Percentage', 'Dollars Gained']].sort_values(by="Dollars Gained", ascending=False)
 
 # Display the expert summary for prior bets
-st.write(expert_summary_prior)
+with timed('transform', 'expert_table (last season)'):
+    last_table = expert_table(summary_df, season - 1).sort_values(by="Dollars Gained", ascending=False)
+with timed('render', 'expert table (last season)'):
+    st.write(last_table)
 
-    
\ No newline at end of file
+# Load the chart libraries and build the chart pages' data in the background, now that this page is up
+start_warmup(db)
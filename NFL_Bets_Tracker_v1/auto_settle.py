@@ -0,0 +1,270 @@
+import argparse
+import json
+import logging
+import os
+import shutil
+import time
+import numpy as np
+import pandas as pd
+from bets_data import prepare, read_bets, settle_bets
+from db import get_database
+from payouts import bet_dollars
+from seasons import current_season
+
+# Settles pending bets from final stat files dropped into a directory. Runs as
+# its own process, next to the Streamlit app, e.g.
+#   python auto_settle.py results/ --database-url $DATABASE_URL
+#
+# Each CSV/JSON file holds rows of Week, Name, Stat, Value (and optionally
+# Season), e.g. "1, Derek Carr, Passing Yards, 251" or, for teams,
+# "1, Minnesota Vikings, Points, 17" and "1, Minnesota Vikings, Points Allowed, 20".
+# Only Pending bets are ever matched, so processing a file twice is harmless.
+#
+# Drop contract: only *.csv and *.json files are picked up, so write a file
+# under another name (e.g. week1.csv.part or .week1.csv) and rename it into
+# place once it's complete. A file is also left alone until its size and
+# modification time are the same on two checks in a row, so one copied in
+# directly isn't read half-written. If the database is busy or down, the file
+# stays where it is and is tried again on the next check.
+
+log = logging.getLogger('auto_settle')
+
+# Bets settled per transaction
+BATCH_SIZE = 500
+
+# How often the drop directory is checked for new files (seconds)
+POLL_INTERVAL = float(os.getenv('AUTO_SETTLE_POLL_INTERVAL', '30'))
+
+STAT_FILE_TYPES = ('.csv', '.json')
+
+# How long a one-off run (--once) waits between its two looks at each file (seconds)
+STABLE_WAIT = float(os.getenv('AUTO_SETTLE_STABLE_WAIT', '2'))
+
+# Combined props settled from the sum of their parts when no combined stat is given
+COMBINED_STATS = {
+    'rushing and receiving yards': ['rushing yards', 'receiving yards'],
+}
+
+
+def read_stat_file(path):
+    """Read a stat file into a frame of season, week, name, stat, value (names lower-cased)."""
+    if path.lower().endswith('.json'):
+        with open(path) as f:
+            stats = pd.DataFrame(json.load(f))
+    else:
+        stats = pd.read_csv(path)
+    stats.columns = [col.strip().lower() for col in stats.columns]
+    missing = {'week', 'name', 'stat', 'value'} - set(stats.columns)
+    if missing:
+        raise ValueError(f"stat file is missing columns: {', '.join(sorted(missing))}")
+    if 'season' not in stats.columns:
+        stats['season'] = current_season()
+
+    stats = stats[['season', 'week', 'name', 'stat', 'value']].copy()
+    stats['name'] = stats['name'].astype(str).str.strip().str.lower()
+    stats['stat'] = stats['stat'].astype(str).str.strip().str.lower()
+    for col in ['season', 'week', 'value']:
+        stats[col] = pd.to_numeric(stats[col], errors='coerce')
+    stats = stats.dropna()
+    # A stat repeated in a later row (a correction) replaces the earlier one
+    return stats.drop_duplicates(['season', 'week', 'name', 'stat'], keep='last')
+
+
+def _with_combined_stats(stats):
+    """Add combined props (e.g. rushing + receiving yards) that the file doesn't give directly."""
+    keyed = stats.set_index(['season', 'week', 'name', 'stat'])['value']
+    extra = []
+    for combined, parts in COMBINED_STATS.items():
+        part_values = keyed[keyed.index.get_level_values('stat').isin(parts)]
+        if part_values.empty:
+            continue
+        totals = part_values.groupby(level=['season', 'week', 'name']).sum().reset_index()
+        extra.append(totals.assign(stat=combined))
+    if not extra:
+        return stats
+    combined = pd.concat([stats] + extra, ignore_index=True)
+    # A combined stat given in the file wins over the derived sum
+    return combined.drop_duplicates(['season', 'week', 'name', 'stat'], keep='first')
+
+
+def _side_line(side):
+    """Split a Side like 'Over 244.5' into ('over', 244.5); an ATS spread like '-4.5' is ('', -4.5)."""
+    parts = side.fillna('').astype(str).str.strip().str.lower().str.extract(r'^(over|under)?\s*([+-]?\d+(?:\.\d+)?)?$')
+    return parts[0].fillna(''), pd.to_numeric(parts[1], errors='coerce')
+
+
+def match_outcomes(pending, stats):
+    """Outcome ('Won'/'Lost'/'Push') for each pending bet the stats settle, NaN where they don't."""
+    stats = _with_combined_stats(stats)
+    keys = pd.DataFrame({
+        'season': pending['season'].astype(float),
+        'week': pending['Week'].astype(float),
+        'name': pending['Pick'].fillna('').astype(str).str.strip().str.lower(),
+        'type': pending['Type'].fillna('').astype(str).str.strip().str.lower(),
+    }, index=pending.index)
+    direction, line = _side_line(pending['Side'])
+
+    stat_value = stats.set_index(['season', 'week', 'name', 'stat'])['value']
+
+    def lookup(stat_names):
+        index = pd.MultiIndex.from_arrays([keys['season'], keys['week'], keys['name'], stat_names])
+        return pd.Series(stat_value.reindex(index).to_numpy(), index=pending.index)
+
+    points = lookup(pd.Series('points', index=pending.index))
+    allowed = lookup(pd.Series('points allowed', index=pending.index))
+    player_stat = lookup(keys['type'])
+
+    # What has to beat zero for the bet to win: spreads and moneylines on the
+    # final margin, player props and game totals against their line
+    kind = keys['type']
+    value = player_stat.where(kind != 'total', points + allowed)
+    margin = np.select(
+        [kind == 'ats', kind == 'moneyline', direction == 'over', direction == 'under'],
+        [points - allowed + line, points - allowed, value - line, line - value],
+        default=np.nan)
+
+    outcomes = pd.Series(np.select([margin > 0, margin < 0, margin == 0], ['Won', 'Lost', 'Push'], default=''),
+                         index=pending.index)
+    return outcomes.where(outcomes != '')
+
+
+def _pending_for(db, conn, stats):
+    """Pending bets in the seasons and weeks a stat file covers."""
+    weeks = stats[['season', 'week']].drop_duplicates()
+    clauses = ' OR '.join(['(season = ? AND Week = ?)'] * len(weeks))
+    params = tuple(int(value) for pair in weeks.itertuples(index=False) for value in pair)
+    return read_bets(db, conn, f"WHERE Outcome = 'Pending' AND ({clauses}) ORDER BY id", params)
+
+
+def _still_pending(db, conn, bet_ids):
+    c = conn.cursor()
+    c.execute(db.sql(f"SELECT id FROM bets WHERE Outcome = 'Pending' AND id IN ({', '.join('?' * len(bet_ids))})"),
+              [int(bet_id) for bet_id in bet_ids])
+    return [row[0] for row in c.fetchall()]
+
+
+def settle_from_stats(db, stats, batch_size=BATCH_SIZE):
+    """Settle every pending bet the stats decide, batch_size bets per transaction.
+
+    Returns (bets settled, frame of the pending bets left unmatched).
+    """
+    prepare(db)
+    if stats.empty:
+        return 0, pd.DataFrame()
+    with db.connection() as conn:
+        pending = _pending_for(db, conn, stats)
+    if pending.empty:
+        return 0, pending
+
+    outcomes = match_outcomes(pending, stats)
+    matched = pending[outcomes.notna()].assign(Outcome=outcomes[outcomes.notna()])
+    matched['Dollars'] = bet_dollars(matched['Outcome'].to_numpy(),
+                                     pd.to_numeric(matched['Wager'], errors='coerce'),
+                                     pd.to_numeric(matched['Odds'], errors='coerce'))
+    settled = 0
+    for start in range(0, len(matched), batch_size):
+        batch = matched.iloc[start:start + batch_size]
+        with db.connection() as conn:
+            # Skip bets settled by someone else since they were read
+            still_pending = set(_still_pending(db, conn, batch['id'].tolist()))
+            batch = batch[batch['id'].isin(still_pending)]
+            settled += settle_bets(db, conn, zip(batch['id'], batch['Outcome'], batch['Dollars']))
+    return settled, pending[outcomes.isna()]
+
+
+def process_file(db, path, batch_size=BATCH_SIZE):
+    """Settle from one stat file and log the bets it left unmatched. Returns bets settled."""
+    stats = read_stat_file(path)
+    settled, unmatched = settle_from_stats(db, stats, batch_size)
+    log.info("%s: %d stat rows, %d bets settled, %d pending bets unmatched",
+             os.path.basename(path), len(stats), settled, len(unmatched))
+    for bet in unmatched.itertuples(index=False):
+        log.warning("Unmatched bet %s: %s (%s) %s, Week %s, %s", bet.id, bet.Pick, bet.Type, bet.Side, bet.Week, bet.Expert)
+    return settled
+
+
+def _move(path, folder):
+    target_dir = os.path.join(os.path.dirname(path), folder)
+    os.makedirs(target_dir, exist_ok=True)
+    shutil.move(path, os.path.join(target_dir, os.path.basename(path)))
+
+
+def _snapshot(directory):
+    """Size and modification time of every stat file in directory, by path."""
+    files = {}
+    for name in os.listdir(directory):
+        if name.startswith('.') or not name.lower().endswith(STAT_FILE_TYPES):
+            continue
+        path = os.path.join(directory, name)
+        try:
+            stat = os.stat(path)
+        except OSError:
+            # Renamed or removed since it was listed
+            continue
+        files[path] = (stat.st_size, stat.st_mtime_ns)
+    return files
+
+
+def process_directory(db, directory, batch_size=BATCH_SIZE, seen=None):
+    """Process every finished stat file waiting in directory, oldest first.
+
+    seen holds each file's size and modification time from the previous
+    check and is updated in place; only files unchanged since then are
+    read. Without it, the files are looked at twice, STABLE_WAIT seconds
+    apart. Files move to processed/ once their bets are settled, or failed/
+    if they can't be read; on a database error they stay put for the next
+    check. Returns bets settled.
+    """
+    if seen is None:
+        seen = _snapshot(directory)
+        time.sleep(STABLE_WAIT)
+    current = _snapshot(directory)
+    ready = [path for path, state in current.items() if seen.get(path) == state]
+    for path in current.keys() - set(ready):
+        log.debug("%s: still being written, checking again later", os.path.basename(path))
+    seen.clear()
+    seen.update(current)
+
+    settled = 0
+    for path in sorted(ready, key=lambda path: current[path][1]):
+        try:
+            settled += process_file(db, path, batch_size)
+        except db.errors as e:
+            log.error("%s: database error, will retry: %s", os.path.basename(path), e)
+            continue
+        except (ValueError, OSError, pd.errors.ParserError) as e:
+            log.error("%s: could not be processed: %s", os.path.basename(path), e)
+            _move(path, 'failed')
+            continue
+        _move(path, 'processed')
+        seen.pop(path, None)
+    return settled
+
+
+def watch(db, directory, interval=POLL_INTERVAL, batch_size=BATCH_SIZE):
+    """Poll directory for stat files until interrupted."""
+    log.info("Watching %s every %ss", directory, interval)
+    seen = {}
+    while True:
+        process_directory(db, directory, batch_size, seen)
+        time.sleep(interval)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Settle pending bets from stat files dropped into a directory.")
+    parser.add_argument('directory')
+    parser.add_argument('--database-url', default=os.getenv('DATABASE_URL', 'test_db.sqlite'))
+    parser.add_argument('--interval', type=float, default=POLL_INTERVAL, help="seconds between checks")
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+    parser.add_argument('--once', action='store_true', help="process the waiting files and exit (e.g. from cron)")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(message)s')
+    db = get_database(args.database_url)
+    if args.once:
+        process_directory(db, args.directory, args.batch_size)
+    else:
+        try:
+            watch(db, args.directory, args.interval, args.batch_size)
+        except KeyboardInterrupt:
+            pass
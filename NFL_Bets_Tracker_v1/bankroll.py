@@ -0,0 +1,87 @@
+import pandas as pd
+from bets_data import cached
+
+# Running profit/loss per expert, read from bankroll_ledger (see rollups.py).
+# Settlements are folded into their day's ledger row as they are written, so
+# a curve is a window-function running sum over a few rows per expert and
+# day instead of a sort and cumsum over every bet.
+
+# One point per expert and day they had bets settled. bankroll runs across
+# every season; season_bankroll starts again at 0 each season.
+DAILY_CURVE_SQL = '''
+SELECT
+    expert AS "Expert",
+    season AS "season",
+    MAX(week) AS "Week",
+    day AS "Date",
+    SUM(settled) AS "bets",
+    SUM(dollars) AS "dollars",
+    SUM(SUM(dollars)) OVER (PARTITION BY expert ORDER BY season, day ROWS UNBOUNDED PRECEDING) AS "bankroll",
+    SUM(SUM(dollars)) OVER (PARTITION BY expert, season ORDER BY day ROWS UNBOUNDED PRECEDING) AS "season_bankroll"
+FROM bankroll_ledger
+GROUP BY expert, season, day
+HAVING SUM(settled) > 0
+ORDER BY expert, season, day
+'''
+
+# One point per expert and week, dated by the week's last settled day
+WEEKLY_CURVE_SQL = '''
+SELECT
+    expert AS "Expert",
+    season AS "season",
+    week AS "Week",
+    MAX(day) AS "Date",
+    SUM(settled) AS "bets",
+    SUM(dollars) AS "dollars",
+    SUM(SUM(dollars)) OVER (PARTITION BY expert ORDER BY season, week ROWS UNBOUNDED PRECEDING) AS "bankroll",
+    SUM(SUM(dollars)) OVER (PARTITION BY expert, season ORDER BY week ROWS UNBOUNDED PRECEDING) AS "season_bankroll"
+FROM bankroll_ledger
+GROUP BY expert, season, week
+HAVING SUM(settled) > 0
+ORDER BY expert, season, week
+'''
+
+CURVE_SQL = {'day': DAILY_CURVE_SQL, 'week': WEEKLY_CURVE_SQL}
+
+MONEY_COLUMNS = ['dollars', 'bankroll', 'season_bankroll']
+
+
+def _read_curves(db, conn, by):
+    curves = db.read_frame(conn, CURVE_SQL[by])
+    curves['Date'] = pd.to_datetime(curves['Date'], errors='coerce')
+    curves[MONEY_COLUMNS] = curves[MONEY_COLUMNS].apply(pd.to_numeric, errors='coerce').fillna(0).round(2)
+    return curves
+
+
+def bankroll_curves(db, by='day'):
+    """Every expert's running profit/loss by 'day' or 'week', cached until the bets table changes."""
+    if by not in CURVE_SQL:
+        raise ValueError(f"Unknown bankroll period {by!r}; use 'day' or 'week'.")
+    return cached(db, 'bankroll_curves', lambda conn: _read_curves(db, conn, by), args=by)
+
+
+def bankroll_figure(curves, seasons=None, per_season=False):
+    """A line per expert of the curves from bankroll_curves(), optionally for some seasons only.
+
+    per_season plots each season's own running total instead of the all-time one.
+    """
+    # Imported here so reading the curves doesn't load Plotly
+    import plotly.express as px
+
+    if seasons is not None:
+        curves = curves[curves['season'].isin(seasons)]
+    y = 'season_bankroll' if per_season else 'bankroll'
+    # WebGL lines keep multi-season daily curves quick to draw
+    fig = px.line(
+        curves,
+        x='Date',
+        y=y,
+        color='Expert',
+        line_group='season' if per_season else None,
+        hover_data=['season', 'Week', 'bets', 'dollars'],
+        labels={y: 'Bankroll', 'Date': 'Date'},
+        title='Running Profit/Loss by Expert',
+        render_mode='webgl',
+    )
+    fig.update_layout(hovermode='closest')
+    return fig
@@ -0,0 +1,246 @@
+import argparse
+import datetime
+import json
+import os
+import platform
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+import numpy as np
+import pandas as pd
+from bankroll import bankroll_curves, bankroll_figure
+from bets_data import (
+    BET_COLUMNS, clear_cache, load_data, load_pending_bets, prepare, search_pending_bets,
+)
+from csv_upload_initial import import_csv
+from db import get_database
+from partitions import drop_bets
+from payouts import bet_dollars
+from risk import pending_risk
+from seasons import current_season
+from simulation import expert_edges, simulate_slate
+from season_charts import season_charts
+from summary_queries import expert_season_summary, expert_table, season_totals
+
+# Synthetic ledgers for timing the app's data paths at sizes well past the
+# real sheet. Run from this directory, e.g.
+#   python benchmark.py --sizes 1000 100000 1000000 --postgres-url postgresql://localhost/bench > report.json
+
+DEFAULT_SIZES = [1000, 10000, 100000]
+
+# The Postgres database is emptied before each size, so point this at a scratch database
+BENCH_POSTGRES_URL = os.getenv('BENCH_POSTGRES_URL')
+
+EXPERTS = ['Seth', 'DT', 'Cade', 'Yani', 'Jacob', 'Tristen', 'Micah', 'TD Queen', 'Nick']
+TEAMS = [
+    'Arizona Cardinals', 'Atlanta Falcons', 'Baltimore Ravens', 'Buffalo Bills', 'Carolina Panthers',
+    'Chicago Bears', 'Cincinnati Bengals', 'Cleveland Browns', 'Dallas Cowboys', 'Denver Broncos',
+    'Detroit Lions', 'Green Bay Packers', 'Houston Texans', 'Indianapolis Colts', 'Jacksonville Jaguars',
+    'Kansas City Chiefs', 'Las Vegas Raiders', 'Los Angeles Chargers', 'Los Angeles Rams', 'Miami Dolphins',
+    'Minnesota Vikings', 'New England Patriots', 'New Orleans Saints', 'New York Giants', 'New York Jets',
+    'Philadelphia Eagles', 'Pittsburgh Steelers', 'San Francisco 49ers', 'Seattle Seahawks',
+    'Tampa Bay Buccaneers', 'Tennessee Titans', 'Washington Commanders',
+]
+# Bet type -> (Team/Player, typical line for the Side column)
+BET_TYPES = {
+    'Passing Yards': ('Player', 245),
+    'Rushing Yards': ('Player', 60),
+    'Receiving TDs': ('Player', 0),
+    'Passing TDs': ('Player', 1),
+    'Rushing And Receiving Yards': ('Player', 80),
+    'ATS': ('Team', None),
+    'MoneyLine': ('Team', None),
+    'Total': ('Team', 45),
+    'Special': ('Player', None),
+}
+# American odds and how often they show up; most lines are -110
+ODDS = [-110, -115, -120, -105, 100, -150, 120, 150, -200, 200, 350]
+ODDS_WEIGHTS = [0.55, 0.1, 0.08, 0.07, 0.04, 0.04, 0.04, 0.03, 0.02, 0.02, 0.01]
+WAGERS = [10, 20, 25, 50]
+WEEKS_PER_SEASON = 18
+
+
+def _format(values, fmt):
+    """fmt applied to each distinct value only, then spread back out (much faster than per row)."""
+    distinct, inverse = np.unique(values, return_inverse=True)
+    return np.array([fmt(value) for value in distinct.tolist()], dtype=object)[inverse]
+
+
+def generate_bets(rows, seasons=5, experts=40, players=600, seed=0):
+    """A synthetic ledger of `rows` bets in the sheet's layout (ID column, MM/DD/YYYY dates).
+
+    Bets are spread evenly over the last `seasons` seasons and their weeks;
+    the final week of the latest season is still Pending.
+    """
+    rng = np.random.default_rng(seed)
+    expert_names = np.array(EXPERTS + [f'Expert {i}' for i in range(len(EXPERTS) + 1, experts + 1)])[:experts]
+    player_names = np.array([f'Player {i}' for i in range(1, players + 1)])
+    type_names = np.array(list(BET_TYPES))
+
+    last_season = current_season() - 1
+    season = last_season - seasons + 1 + np.arange(rows) * seasons // rows
+    week = rng.integers(1, WEEKS_PER_SEASON + 1, rows)
+    kickoff = _format(season * 100 + week, lambda key: (
+        datetime.date(key // 100, 9, 7) + datetime.timedelta(weeks=key % 100 - 1)).strftime('%m/%d/%Y'))
+
+    bet_type = rng.choice(type_names, rows)
+    team_player = pd.Series(bet_type).map({name: kind for name, (kind, _) in BET_TYPES.items()}).to_numpy()
+    pick = np.where(team_player == 'Team', rng.choice(TEAMS, rows), rng.choice(player_names, rows))
+
+    # Over/under lines around each type's typical number, spreads for ATS
+    base_line = pd.Series(bet_type).map({name: line for name, (_, line) in BET_TYPES.items()}).to_numpy(dtype=float)
+    line = np.floor(base_line * rng.uniform(0.6, 1.4, rows)) + 0.5
+    spread = rng.integers(-14, 15, rows) + rng.choice([0, 0.5], rows)
+    over_under = np.where(rng.random(rows) < 0.7, 'Over ', 'Under ').astype(object)
+    side = np.where(bet_type == 'ATS', _format(spread, '{:+g}'.format),
+                    np.where(np.isnan(line), '', over_under + _format(line, '{:g}'.format)))
+
+    odds = rng.choice(ODDS, rows, p=ODDS_WEIGHTS)
+    wager = rng.choice(WAGERS, rows).astype(float)
+    outcome = rng.choice(['Won', 'Lost', 'Push'], rows, p=[0.48, 0.48, 0.04])
+    outcome = np.where((season == last_season) & (week == WEEKS_PER_SEASON), 'Pending', outcome)
+
+    return pd.DataFrame({
+        'ID': np.arange(1, rows + 1),
+        'Date': kickoff,
+        'Week': week,
+        'Expert': rng.choice(expert_names, rows),
+        'Team_Player': team_player,
+        'Pick': pick,
+        'Type': bet_type,
+        'Side': side,
+        'Wager': wager,
+        'Odds': odds,
+        'Outcome': outcome,
+        'Dollars': bet_dollars(outcome, wager, odds),
+    }, columns=['ID'] + BET_COLUMNS)
+
+
+def reset_database(db):
+    """Drop the tracker's tables so an import starts from an empty database."""
+    drop_bets(db)
+    with db.connection() as conn:
+        c = conn.cursor()
+        for table in ['bet_rollups', 'bankroll_ledger', 'table_versions', 'closed_seasons']:
+            c.execute(f'DROP TABLE IF EXISTS {table}')
+    clear_cache(db)
+
+
+def _time(func, repeat, cold, db):
+    """Run func `repeat` times; with cold=True, empty the result cache before each run."""
+    timings = []
+    for _ in range(repeat):
+        if cold:
+            clear_cache(db)
+            prepare(db)
+        started = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - started)
+    return timings
+
+
+def _summary(db):
+    summary_df = expert_season_summary(db)
+    season = int(summary_df['season'].max())
+    season_totals(summary_df, season)
+    expert_table(summary_df, season)
+
+
+def _page2(db):
+    # page2 charts the season before the current one, the latest generated here
+    season_charts(db, current_season() - 1)
+
+
+def _bankroll(db):
+    bankroll_figure(bankroll_curves(db, 'day'))
+
+
+def _pending(db):
+    load_pending_bets(db)
+    search_pending_bets(db, 'passing')
+
+
+def _risk(db):
+    pending_risk(load_pending_bets(db))
+
+
+def _simulation(db):
+    simulate_slate(load_pending_bets(db), expert_edges(expert_season_summary(db)), seed=0)
+
+
+READ_STEPS = {
+    'load_data': load_data,
+    'summary': _summary,
+    'page2_charts': _page2,
+    'bankroll_curves': _bankroll,
+    'pending_lookup': _pending,
+    'pending_risk': _risk,
+    'simulation': _simulation,
+}
+
+
+def run_backend(backend, db, csv_path, rows, repeat):
+    """Import the ledger into an empty database, then time each read path cold and warm."""
+    reset_database(db)
+    started = time.perf_counter()
+    stats = import_csv(db, csv_path)
+    seconds = time.perf_counter() - started
+    results = [{'backend': backend, 'rows': rows, 'step': 'bulk_import', 'seconds': seconds,
+                'rows_per_sec': stats['rows'] / seconds if seconds > 0 else None}]
+    print(f"  {backend} {rows:>9,} {'bulk_import':<15} {seconds:8.4f}s", file=sys.stderr)
+
+    for step, func in READ_STEPS.items():
+        cold = _time(lambda: func(db), repeat, True, db)
+        warm = _time(lambda: func(db), repeat, False, db)
+        results.append({'backend': backend, 'rows': rows, 'step': step,
+                        'seconds': statistics.median(cold), 'min_seconds': min(cold),
+                        'warm_seconds': statistics.median(warm),
+                        'rows_per_sec': rows / statistics.median(cold)})
+        print(f"  {backend} {rows:>9,} {step:<15} {statistics.median(cold):8.4f}s", file=sys.stderr)
+    return results
+
+
+def run(sizes=DEFAULT_SIZES, postgres_url=BENCH_POSTGRES_URL, repeat=3, label=None):
+    """Benchmark every size on SQLite (and Postgres if a URL is given). Returns the report dict."""
+    report = {
+        'label': label,
+        'created': datetime.datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'sqlite': sqlite3.sqlite_version,
+        'pandas': pd.__version__,
+        'numpy': np.__version__,
+        'backends': ['sqlite'] + (['postgres'] if postgres_url else []),
+        'results': [],
+    }
+    with tempfile.TemporaryDirectory() as workdir:
+        for rows in sizes:
+            started = time.perf_counter()
+            csv_path = os.path.join(workdir, f'bets_{rows}.csv')
+            generate_bets(rows).to_csv(csv_path, index=False)
+            print(f"Generated {rows:,} bets in {time.perf_counter() - started:.2f}s", file=sys.stderr)
+
+            sqlite_db = get_database(os.path.join(workdir, f'bets_{rows}.sqlite'))
+            report['results'] += run_backend('sqlite', sqlite_db, csv_path, rows, repeat)
+            sqlite_db.close()
+            if postgres_url:
+                report['results'] += run_backend('postgres', get_database(postgres_url), csv_path, rows, repeat)
+    return report
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Time the tracker's data paths on synthetic ledgers and print a JSON report.")
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES, help="ledger sizes in rows (1k to 5M)")
+    parser.add_argument('--postgres-url', default=BENCH_POSTGRES_URL, help="scratch Postgres database; its tables are dropped")
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--label', help="name for this run, e.g. a version or commit")
+    parser.add_argument('--output', help="write the report here instead of stdout")
+    args = parser.parse_args()
+
+    report = run(args.sizes, args.postgres_url, args.repeat, args.label)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
@@ -0,0 +1,366 @@
+import os
+import threading
+import pandas as pd
+from db import CHANGES_CHANNEL
+from partitions import bets_table, commits_atomically, ensure_partitioned, ensure_partitions, next_bet_id, update_bets
+from profiling import record_cache, timed
+from rollups import apply_bets, ensure_rollups_table
+from schema import BET_COLUMNS, ensure_schema
+from seasons import season_for, to_date
+
+# Every write to the bets table bumps its row here, so readers can keep
+# reusing the cached frame until something actually changes. The rows a
+# write touches get the new version as their revision, so a cached frame
+# only needs the rows with a newer revision than its own version. Writes
+# that remove bets (closing a season) also set bets_reset, which makes
+# cached frames read from scratch instead.
+VERSION_TABLE_DDL = '''
+CREATE TABLE IF NOT EXISTS table_versions (
+    name TEXT PRIMARY KEY,
+    version INTEGER NOT NULL
+)
+'''
+
+# Quoted aliases keep the frame's column names the same on SQLite and
+# Postgres (which folds unquoted names to lower case)
+SELECT_BETS_SQL = 'SELECT id AS "id", ' + ', '.join(f'{col} AS "{col}"' for col in BET_COLUMNS + ['season']) + ' FROM bets'
+
+# Compact frame layout: text columns as categoricals, Outcome with fixed
+# categories so its codes are int8 (0 Pending, 1 Won, 2 Lost, 3 Push)
+CATEGORY_COLUMNS = ['Expert', 'Team_Player', 'Pick', 'Type', 'Side']
+OUTCOMES = ['Pending', 'Won', 'Lost', 'Push']
+MONEY_COLUMNS = ['Wager', 'Odds', 'Dollars']
+
+# How often an open page re-checks the pending bets table for other users' writes
+# (seconds); a check that finds nothing new doesn't touch the database
+PENDING_REFRESH_SECONDS = float(os.getenv('PENDING_REFRESH_SECONDS', '5'))
+
+# Most pending bets the picker shows for one search
+PICKER_LIMIT = 200
+
+# Outcomes of a settled bet, and the Completed Bets tab's rows per page
+COMPLETED_OUTCOMES = ['Won', 'Lost', 'Push']
+COMPLETED_PAGE_SIZE = 50
+
+# Most entries kept per name for results cached per argument (see cached());
+# past it the least recently used is dropped
+CACHE_KEYED_ENTRIES = int(os.getenv('CACHE_KEYED_ENTRIES', '64'))
+
+# Cached results (the bets frame and aggregates built from it), keyed by
+# (database URL, name), or (database URL, name, args) for keyed results, and
+# holding (version, args, change token, result). Kept in use order.
+_cache = {}
+_cache_lock = threading.Lock()
+
+# Databases whose table_versions table has already been checked
+_prepared = set()
+
+
+def ensure_version_table(conn):
+    """Create the table_versions table and its bets and bets_reset rows if missing."""
+    c = conn.cursor()
+    c.execute(VERSION_TABLE_DDL)
+    for name in ['bets', 'bets_reset']:
+        c.execute(f'''
+            INSERT INTO table_versions (name, version)
+            SELECT '{name}', 0
+            WHERE NOT EXISTS (SELECT 1 FROM table_versions WHERE name = '{name}')
+        ''')
+    conn.commit()
+
+
+def get_version(conn):
+    """Return the current version of the bets table."""
+    c = conn.cursor()
+    c.execute("SELECT version FROM table_versions WHERE name = 'bets'")
+    row = c.fetchone()
+    return row[0] if row else 0
+
+
+def _get_versions(conn):
+    """(version, version of the last write that removed bets) of the bets table."""
+    c = conn.cursor()
+    c.execute("SELECT name, version FROM table_versions WHERE name IN ('bets', 'bets_reset')")
+    versions = dict(c.fetchall())
+    return versions.get('bets', 0), versions.get('bets_reset', 0)
+
+
+def bump_version(db, conn, reset=False):
+    """Mark the bets table as changed and return its new version, the revision for the rows being written.
+
+    Call inside the write's transaction, before writing the rows: on
+    Postgres the update locks the version row, so concurrent writers get
+    their revisions in commit order. reset=True when the write removes bets.
+    """
+    c = conn.cursor()
+    c.execute("UPDATE table_versions SET version = version + 1 WHERE name = 'bets'")
+    if reset:
+        c.execute("UPDATE table_versions SET version = (SELECT version FROM table_versions WHERE name = 'bets') WHERE name = 'bets_reset'")
+    if db.backend == 'postgres':
+        # Delivered to other processes' listeners when the transaction commits
+        c.execute(f'NOTIFY {CHANGES_CHANNEL}')
+    db.mark_changed(conn)
+    return get_version(conn)
+
+
+def closed_seasons(conn):
+    """Seasons that have been archived to snapshot files."""
+    c = conn.cursor()
+    c.execute('SELECT season FROM closed_seasons')
+    return {row[0] for row in c.fetchall()}
+
+
+def prepare(db):
+    """Make sure the bets schema and its bookkeeping are up to date, once per database."""
+    if db.url in _prepared:
+        return
+    with db.connection() as conn:
+        changed = ensure_schema(db, conn)
+        changed += ensure_partitioned(db, conn)
+        ensure_version_table(conn)
+        ensure_rollups_table(db, conn)
+        if changed:
+            bump_version(db, conn, reset=True)
+    _prepared.add(db.url)
+
+
+def add_bet(db, conn, bet):
+    """Insert one bet (values in BET_COLUMNS order) and fold it into the rollups.
+
+    Runs on the caller's connection so the insert, the rollup update and the
+    version bump commit together; the bet goes into its season's partition.
+    Returns the new bet's id.
+    """
+    prepare(db)
+    # Store the date as ISO and derive its season
+    bet_date = to_date(bet[0])
+    season = season_for(bet_date)
+    columns = ['id'] + BET_COLUMNS + ['season', 'revision']
+    if season in closed_seasons(conn):
+        raise ValueError(f"The {season} season is closed.")
+    ensure_partitions(db, conn, [season])
+    revision = bump_version(db, conn)
+    bet_id = next_bet_id(db, conn)
+    values = (bet_id, bet_date.isoformat()) + tuple(bet[1:]) + (season, revision)
+    db.execute(conn, 'add_bet', f"INSERT INTO {bets_table(db, season)} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})", values)
+    apply_bets(db, conn, [bet_id], 1)
+    return bet_id
+
+
+def settle_bet(db, conn, bet_id, outcome, dollars):
+    """Set a bet's outcome and dollars, moving it between rollup buckets."""
+    settle_bets(db, conn, [(bet_id, outcome, dollars)])
+
+
+def settle_bets(db, conn, settlements):
+    """Settle many bets at once from (bet_id, outcome, dollars) tuples.
+
+    A single version bump, then one executemany per partition for the
+    UPDATE and one each for the rollup adjustments, all in the caller's transaction.
+    """
+    prepare(db)
+    settlements = [(outcome, float(dollars), int(bet_id)) for bet_id, outcome, dollars in settlements]
+    if not settlements:
+        return 0
+    revision = bump_version(db, conn)
+    rows = [(outcome, dollars, revision, bet_id) for outcome, dollars, bet_id in settlements]
+    bet_ids = [row[-1] for row in rows]
+    apply_bets(db, conn, bet_ids, -1)
+    update_bets(db, conn, 'settle_bet', 'Outcome = ?, Dollars = ?, revision = ?', rows)
+    apply_bets(db, conn, bet_ids, 1)
+    return len(rows)
+
+
+def cached(db, name, compute, args=(), patch=None, keyed=False):
+    """Return compute(conn), reusing the result until the bets table version changes.
+
+    args identifies what was computed (e.g. a season), so a different
+    argument replaces the cached entry; with keyed, each args gets an entry
+    of its own instead (up to CACHE_KEYED_ENTRIES per name), for results
+    that sessions ask for with different arguments at once. With patch, a changed version is
+    caught up by patch(conn, cached result, cached version) instead of
+    compute(), unless bets were removed since or the bets may not have
+    committed together with their version bump. Cached results are shared
+    between sessions, so treat them as read-only.
+    """
+    prepare(db)
+    key = (db.url, name, args) if keyed else (db.url, name)
+    # Taken before the version is read, so a write landing in between is seen next time
+    token = db.change_token()
+    with _cache_lock:
+        hit = _cache.pop(key, None)
+        if hit is not None:
+            # Back in as the most recently used
+            _cache[key] = hit
+    if hit is not None and hit[1] == args and hit[2] == token:
+        # Nothing has been written since the entry was checked
+        record_cache(name, True)
+        return hit[3]
+    with db.connection() as conn:
+        version, reset = _get_versions(conn)
+        if hit is not None and hit[0] == version and hit[1] == args:
+            record_cache(name, True)
+            result = hit[3]
+        else:
+            record_cache(name, False)
+            # Patching relies on a write's rows being visible as soon as its
+            # version bump is; otherwise rows seen late would be skipped for good
+            patchable = patch is not None and hit is not None and hit[1] == args and reset <= hit[0]
+            if patchable and commits_atomically(db, conn):
+                with timed('query', name, f'rows changed since version {hit[0]}') as span:
+                    result = patch(conn, hit[3], hit[0])
+                    span.rows = len(result) if hasattr(result, '__len__') else None
+            else:
+                with timed('query', name, repr(args) if args else '') as span:
+                    result = compute(conn)
+                    span.rows = len(result) if hasattr(result, '__len__') else None
+    with _cache_lock:
+        _cache.pop(key, None)
+        _cache[key] = (version, args, token, result)
+        if keyed:
+            entries = [k for k in _cache if len(k) == 3 and k[:2] == key[:2]]
+            for k in entries[:-CACHE_KEYED_ENTRIES]:
+                del _cache[k]
+    return result
+
+
+def read_changed_bets(db, conn, since):
+    """Bets written after version `since`, found through the revision index."""
+    return read_bets(db, conn, 'WHERE revision > ?', (since,))
+
+
+def patch_bets(bets_df, changed, keep=None, compact=False, order=None):
+    """A copy of bets_df with the changed rows swapped in for their old versions.
+
+    keep(changed) picks the changed rows that belong in the frame (the rest
+    are only dropped from it). compact frames get the new rows in the
+    compact layout, their categories merged in.
+    """
+    kept = bets_df[~bets_df['id'].isin(changed['id'])]
+    added = changed[keep(changed)] if keep is not None else changed
+    if compact:
+        added = compact_bets(added)
+        for col in CATEGORY_COLUMNS:
+            categories = kept[col].cat.categories.append(added[col].cat.categories).unique()
+            kept = kept.assign(**{col: kept[col].cat.set_categories(categories)})
+            added = added.assign(**{col: added[col].cat.set_categories(categories)})
+    patched = pd.concat([kept, added], ignore_index=True) if len(added) else kept.reset_index(drop=True)
+    if order:
+        patched = patched.sort_values(order, ignore_index=True)
+    return patched
+
+
+def clear_cache(db):
+    """Forget db's cached results and schema check, e.g. after its tables were dropped."""
+    with _cache_lock:
+        for key in [key for key in _cache if key[0] == db.url]:
+            del _cache[key]
+    _prepared.discard(db.url)
+
+
+def read_bets(db, conn, where='', params=()):
+    """Run SELECT_BETS_SQL with an optional WHERE/ORDER BY clause (? placeholders)."""
+    return db.read_frame(conn, f'{SELECT_BETS_SQL} {where}', params)
+
+
+def compact_bets(bets_df):
+    """Shrink a bets frame for caching: categoricals, int8 outcome codes, float32 money, datetime64 dates.
+
+    Group-bys, value_counts() and == 'Won' masks then work on small integer
+    codes instead of Python strings. Group by the categorical columns with
+    observed=True.
+    """
+    compact = pd.DataFrame({'id': bets_df['id'].astype('int64')}, index=bets_df.index)
+    compact['Date'] = pd.to_datetime(bets_df['Date'], errors='coerce')
+    compact['Week'] = pd.to_numeric(bets_df['Week'], errors='coerce', downcast='integer')
+    for col in CATEGORY_COLUMNS:
+        compact[col] = bets_df[col].astype('category')
+    for col in MONEY_COLUMNS:
+        compact[col] = pd.to_numeric(bets_df[col], errors='coerce').astype('float32')
+    compact['Outcome'] = pd.Categorical(bets_df['Outcome'], categories=OUTCOMES)
+    compact['season'] = pd.to_numeric(bets_df['season'], errors='coerce', downcast='integer')
+    return compact[['id'] + BET_COLUMNS + ['season']]
+
+
+def load_data(db):
+    """Load the bets table as a compact frame, reusing it while the version is unchanged.
+
+    After a write only the changed rows are read and patched in.
+    """
+    # Load bets into DataFrame
+    return cached(db, 'bets', lambda conn: compact_bets(read_bets(db, conn)),
+                  patch=lambda conn, bets_df, since: patch_bets(bets_df, read_changed_bets(db, conn, since), compact=True))
+
+
+def load_pending_bets(db):
+    """Pending bets, looked up through the Outcome index; after a write only the changed rows are read."""
+    return cached(db, 'pending_bets', lambda conn: read_bets(db, conn, "WHERE Outcome = 'Pending' ORDER BY id"),
+                  patch=lambda conn, pending_df, since: patch_bets(
+                      pending_df, read_changed_bets(db, conn, since), keep=lambda df: df['Outcome'] == 'Pending', order='id'))
+
+
+def search_pending_bets(db, term='', limit=PICKER_LIMIT):
+    """Pending bets whose expert, pick or type contains `term` (or whose week is `term`).
+
+    The filtering happens in SQL on the Outcome-indexed pending rows, so the
+    page only receives the matches.
+    """
+    term = term.strip().lower()
+    where = "WHERE Outcome = 'Pending'"
+    params = ()
+    if term:
+        like = f'%{term}%'
+        where += ' AND (LOWER(Expert) LIKE ? OR LOWER(Pick) LIKE ? OR LOWER(Type) LIKE ? OR CAST(Week AS TEXT) = ?)'
+        params = (like, like, like, term)
+    return cached(db, 'pending_search', lambda conn: read_bets(
+        db, conn, f'{where} ORDER BY id LIMIT {int(limit)}', params), args=(term, limit), keyed=True)
+
+
+def bet_labels(bets_df):
+    """Map bet id -> picker label, built once per frame instead of per option."""
+    labels = (bets_df['Pick'].fillna('').astype(str) + ' (' + bets_df['Type'].fillna('').astype(str) + ') - '
+              + bets_df['Expert'].fillna('').astype(str) + ', Week ' + bets_df['Week'].astype(str))
+    return dict(zip(bets_df['id'].tolist(), labels.tolist()))
+
+
+def load_completed_page(db, start=None, end=None, experts=(), types=(), outcomes=(), after=None, page_size=COMPLETED_PAGE_SIZE):
+    """One page of settled bets, newest first, with the date window and filters applied in SQL.
+
+    Pages are keyed on (Date, id): `after` is the cursor returned with the
+    previous page, so every page is a range scan of the (Date, id) index
+    however far back it goes. Returns (page, cursor for the next page or None).
+    """
+    outcomes = list(outcomes) or COMPLETED_OUTCOMES
+    # Outcome || '' keeps SQLite from picking the Outcome index (most rows are
+    # settled) over the (Date, id) index that already returns rows in page order
+    clauses = [f"Outcome || '' IN ({', '.join('?' * len(outcomes))})"]
+    # A copy, so the parameters added below don't end up in COMPLETED_OUTCOMES
+    params = list(outcomes)
+    # The season bounds let Postgres skip the partitions outside the window
+    if start:
+        clauses.append('Date >= ? AND season >= ?')
+        params += [to_date(start).isoformat(), season_for(to_date(start))]
+    if end:
+        clauses.append('Date <= ? AND season <= ?')
+        params += [to_date(end).isoformat(), season_for(to_date(end))]
+    if experts:
+        clauses.append(f"Expert IN ({', '.join('?' * len(experts))})")
+        params += list(experts)
+    if types:
+        clauses.append(f"Type IN ({', '.join('?' * len(types))})")
+        params += list(types)
+    if after:
+        # Written so Date <= ? can seek into the index
+        clauses.append('Date <= ? AND (Date < ? OR id < ?)')
+        params += [after[0], after[0], int(after[1])]
+    # One extra row tells us whether there is a next page
+    where = f"WHERE {' AND '.join(clauses)} ORDER BY Date DESC, id DESC LIMIT {int(page_size) + 1}"
+    params = tuple(params)
+
+    # Each filter and cursor gets its own entry, so paging back and forth is served from the cache
+    page = cached(db, 'completed_page', lambda conn: read_bets(db, conn, where, params), args=(where, params), keyed=True)
+    if len(page) <= page_size:
+        return page, None
+    page = page.iloc[:page_size]
+    last = page.iloc[-1]
+    return page, (str(last['Date']), int(last['id']))
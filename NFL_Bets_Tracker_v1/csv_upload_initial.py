@@ -1,31 +1,145 @@
-import sqlite3
+import argparse
+import os
+import time
 import pandas as pd
+from bets_data import BET_COLUMNS, bump_version, closed_seasons, prepare
+from db import get_database
+from partitions import ROUTE_BATCH_SIZE, bets_table, delete_bets, ensure_partitions, next_bet_ids
+from payouts import bet_dollars
+from rollups import apply_bets
+from seasons import SEASON_START_MONTH
 
-def import_csv_to_db(csv_path, db_path='test_db.sqlite'):
-    try:
-        # Connect to SQLite database
-        conn = sqlite3.connect(db_path)
+# Rows read, inserted and committed per transaction
+CHUNK_SIZE = 5000
+
+EXPECTED_COLUMNS = set(BET_COLUMNS)
+
+# Text columns are read as strings so values like a Side of "-4" aren't turned into floats
+TEXT_COLUMNS = ['Expert', 'Team_Player', 'Pick', 'Type', 'Side', 'Outcome']
+NUMERIC_COLUMNS = ['Week', 'Wager', 'Odds', 'Dollars']
+
+# Columns read for each row: the sheet's ID, the bet itself and its season
+# (the id and revision are set when the chunk is written)
+IMPORT_COLUMNS = ['source_id'] + BET_COLUMNS + ['season']
+
+
+def _prepare_chunk(chunk):
+    """Normalize one chunk of sheet rows: ISO dates, season, numbers, NULLs."""
+    chunk = chunk.rename(columns={'ID': 'source_id'})
+    chunk['source_id'] = pd.to_numeric(chunk['source_id'], errors='coerce')
+    chunk = chunk[chunk['source_id'].notna()].copy()
+    chunk['source_id'] = chunk['source_id'].astype('int64')
+    # A repeated ID within the sheet: the last row wins, as it would across chunks
+    chunk = chunk.drop_duplicates('source_id', keep='last')
+
+    dates = pd.to_datetime(chunk['Date'], format='mixed', errors='coerce')
+    chunk['Date'] = dates.dt.strftime('%Y-%m-%d')
+    chunk['season'] = (dates.dt.year - (dates.dt.month < SEASON_START_MONTH).astype(int)).astype('Int64')
+    for col in NUMERIC_COLUMNS:
+        chunk[col] = pd.to_numeric(chunk[col], errors='coerce')
+    # Whole numbers stay ints (not 3.0) when a column has blanks, as COPY needs them
+    chunk['Week'] = chunk['Week'].round().astype('Int64')
+    # Price Dollars from the wager and odds rather than trusting the sheet's;
+    # rows missing either keep the sheet's value
+    priced = chunk['Wager'].notna() & chunk['Odds'].notna()
+    chunk.loc[priced, 'Dollars'] = bet_dollars(
+        chunk.loc[priced, 'Outcome'].to_numpy(), chunk.loc[priced, 'Wager'], chunk.loc[priced, 'Odds'])
+
+    chunk = chunk[IMPORT_COLUMNS].astype(object)
+    return chunk.where(chunk.notna(), None)
+
+
+def _existing_ids(db, conn, source_ids):
+    """{sheet ID: bet id} for the sheet IDs already imported."""
+    known = {}
+    c = conn.cursor()
+    for start in range(0, len(source_ids), ROUTE_BATCH_SIZE):
+        batch = source_ids[start:start + ROUTE_BATCH_SIZE]
+        c.execute(db.sql(f"SELECT source_id, id FROM bets WHERE source_id IN ({', '.join('?' * len(batch))})"), batch)
+        known.update(c.fetchall())
+    return known
 
-        # Load CSV data into a DataFrame
-        df = pd.read_csv(csv_path)
 
-        # Ensure the DataFrame has the correct columns
-        expected_columns = {'Date', 'Week', 'Expert', 'Team_Player', 'Pick', 'Type', 'Side', 'Wager', 'Odds', 'Outcome', 'Dollars'}
-        if not expected_columns.issubset(df.columns):
-            print("CSV file does not have the required columns.")
-            return
-        
-        # Insert DataFrame into the database
-        df.to_sql('bets', conn, if_exists='append', index=False)
+def import_csv(db, source, chunk_size=CHUNK_SIZE, progress=None):
+    """Stream a sheet export into the bets table, upserting on its ID column.
 
-        print("CSV data has been imported successfully.")
+    `source` is a path or file-like object (e.g. a Streamlit upload). Each
+    chunk is bulk-loaded (COPY on Postgres) into its seasons' partitions in
+    its own transaction, together with its rollup updates, so memory stays
+    bounded however big the file is. The sheet's ID is kept as source_id:
+    rows whose ID is already there are replaced, keeping their bet id (even
+    if their date moved them to another season), so re-running an import
+    updates rows instead of duplicating them; new rows get ids from the
+    database, like bets entered in the app. Returns a dict of row counts and timing.
+    """
+    prepare(db)
+    started = time.perf_counter()
+    stats = {'rows': 0, 'inserted': 0, 'updated': 0, 'skipped': 0}
+    with db.connection() as conn:
+        closed = closed_seasons(conn)
 
-    except sqlite3.Error as e:
+    reader = pd.read_csv(source, chunksize=chunk_size, dtype={col: str for col in TEXT_COLUMNS + ['Date']})
+    for chunk in reader:
+        missing = EXPECTED_COLUMNS - set(chunk.columns)
+        if 'ID' not in chunk.columns:
+            missing.add('ID')
+        if missing:
+            raise ValueError(f"CSV file is missing required columns: {', '.join(sorted(missing))}")
+
+        rows = _prepare_chunk(chunk)
+        # Closed seasons live in their snapshot files and can't be changed
+        rows = rows[~rows['season'].isin(closed)]
+        stats['skipped'] += len(chunk) - len(rows)
+        if rows.empty:
+            continue
+        source_ids = [int(source_id) for source_id in rows['source_id']]
+
+        seasons = rows['season'].unique().tolist()
+        with db.connection() as conn:
+            ensure_partitions(db, conn, seasons)
+            # Rows already imported keep their id; the rest get new ones
+            known = _existing_ids(db, conn, source_ids)
+            new_ids = iter(next_bet_ids(db, conn, len(source_ids) - len(known)))
+            ids = [known[source_id] if source_id in known else next(new_ids) for source_id in source_ids]
+            rows = rows.assign(id=ids, revision=bump_version(db, conn))
+            # Take rows being replaced out of the rollups and their partitions,
+            # insert the new rows, then add them to the rollups
+            existing = list(known.values())
+            apply_bets(db, conn, existing, -1)
+            delete_bets(db, conn, existing)
+            tables = rows['season'].map(lambda season: bets_table(db, season))
+            for table, table_rows in rows.groupby(tables):
+                db.insert_frame(conn, table, table_rows)
+            apply_bets(db, conn, ids, 1)
+
+        stats['rows'] += len(rows)
+        stats['updated'] += len(existing)
+        stats['inserted'] += len(rows) - len(existing)
+        if progress:
+            progress(stats)
+
+    stats['seconds'] = time.perf_counter() - started
+    stats['rows_per_sec'] = stats['rows'] / stats['seconds'] if stats['seconds'] > 0 else 0
+    return stats
+
+
+def import_csv_to_db(csv_path, db_path='test_db.sqlite', chunk_size=CHUNK_SIZE):
+    """Import a sheet export from the command line and print a summary."""
+    try:
+        stats = import_csv(get_database(db_path), csv_path, chunk_size)
+    except (ValueError, OSError) as e:
         print(f"An error occurred: {e}")
-    
-    finally:
-        if conn:
-            conn.close()
+        return
+    print(f"CSV data has been imported successfully: {stats['rows']} rows "
+          f"({stats['inserted']} new, {stats['updated']} updated, {stats['skipped']} skipped without an ID or in a closed season) "
+          f"in {stats['seconds']:.2f}s ({stats['rows_per_sec']:,.0f} rows/sec).")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Import a bets sheet export (CSV) into the bets table.")
+    parser.add_argument('csv_path')
+    parser.add_argument('--database-url', default=os.getenv('DATABASE_URL', 'test_db.sqlite'))
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+    args = parser.parse_args()
 
-# Example usage
-import_csv_to_db("C:/Users/sethmiller_ryanlawn/OneDrive - Ryan Lawn and Tree/Desktop/Home/NFL/NFL_Bets_Tracker/NFL 23 - Sheet3.csv")
\ No newline at end of file
+    import_csv_to_db(args.csv_path, args.database_url, args.chunk_size)
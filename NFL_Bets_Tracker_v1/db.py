@@ -0,0 +1,310 @@
+import io
+import itertools
+import os
+import re
+import select
+import sqlite3
+import threading
+import time
+import weakref
+from contextlib import contextmanager
+from urllib.parse import urlparse
+
+# How long a SQLite connection waits on a locked database before failing (ms)
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv('SQLITE_BUSY_TIMEOUT_MS', '5000'))
+
+# Bounds for the Postgres connection pool
+PG_POOL_MIN = int(os.getenv('PG_POOL_MIN', '1'))
+PG_POOL_MAX = int(os.getenv('PG_POOL_MAX', '10'))
+
+# Pooled Postgres connections idle longer than this are pinged before reuse (seconds)
+PG_HEALTH_CHECK_INTERVAL = float(os.getenv('PG_HEALTH_CHECK_INTERVAL', '30'))
+
+# Rows fetched per round trip when a Postgres read streams through a server-side cursor
+PG_FETCH_SIZE = int(os.getenv('PG_FETCH_SIZE', '10000'))
+
+# Prepared statements sent per round trip by executemany() on Postgres
+PG_BATCH_SIZE = int(os.getenv('PG_BATCH_SIZE', '500'))
+
+# Channel a Postgres write's NOTIFY goes out on (see bets_data.bump_version)
+CHANGES_CHANNEL = 'bets_changed'
+
+# One database object per DATABASE_URL for the whole process
+_databases = {}
+_databases_lock = threading.Lock()
+
+
+def is_postgres_url(url):
+    """Return True if the URL points at a Postgres server."""
+    return urlparse(url).scheme in ('postgres', 'postgresql')
+
+
+def sqlite_path(url):
+    """Turn a sqlite:/// URL (or a plain file path) into a file path."""
+    if url.startswith('sqlite:///'):
+        return url[len('sqlite:///'):]
+    return url
+
+
+class SQLiteDatabase:
+    """A single process-wide SQLite handle in WAL mode, shared by every session."""
+
+    backend = 'sqlite'
+
+    # What a failed query raises, for callers that retry rather than give up
+    errors = (sqlite3.Error,)
+
+    def __init__(self, url):
+        self.url = url
+        self.path = sqlite_path(url)
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, timeout=SQLITE_BUSY_TIMEOUT_MS / 1000)
+        # WAL lets readers carry on while a writer holds the lock
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute(f'PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._lock = threading.RLock()
+
+    def sql(self, query):
+        """Queries are written with ? placeholders, which SQLite uses as-is."""
+        return query
+
+    @contextmanager
+    def connection(self):
+        """Borrow the shared connection; commits on success, rolls back on error."""
+        with self._lock:
+            try:
+                yield self._conn
+                self._conn.commit()
+            except Exception:
+                self._conn.rollback()
+                raise
+
+    def change_token(self):
+        """A value that changes whenever the database may have been written to.
+
+        PRAGMA data_version moves when another connection (another process)
+        commits; total_changes when this process's connection writes. While
+        neither moves, cached reads can skip checking the database.
+        """
+        with self._lock:
+            return self._conn.execute('PRAGMA main.data_version').fetchone()[0], self._conn.total_changes
+
+    def mark_changed(self, conn):
+        """Note a write in conn's transaction (total_changes already records it)."""
+
+    def read_frame(self, conn, query, params=()):
+        """Run a SELECT (? placeholders) into a DataFrame."""
+        import pandas as pd
+        return pd.read_sql(query, conn, params=params)
+
+    def execute(self, conn, name, query, params=()):
+        """Run one of the app's repeated write statements and return its cursor.
+
+        sqlite3 already keeps compiled statements in a per-connection cache,
+        so `name` only matters on Postgres.
+        """
+        c = conn.cursor()
+        c.execute(query, params)
+        return c
+
+    def executemany(self, conn, name, query, rows):
+        """Run a repeated write statement once per row of parameters."""
+        conn.cursor().executemany(query, rows)
+
+    def insert_frame(self, conn, table, frame):
+        """Insert frame's rows into table (columns named as in the table)."""
+        columns = list(frame.columns)
+        conn.cursor().executemany(f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})",
+                                  list(frame.itertuples(index=False, name=None)))
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class PostgresDatabase:
+    """A bounded, health-checked psycopg2 connection pool.
+
+    Large reads stream through named server-side cursors, the add/settle
+    statements are prepared once per connection, and bulk inserts use COPY.
+    """
+
+    backend = 'postgres'
+
+    def __init__(self, url, minconn=PG_POOL_MIN, maxconn=PG_POOL_MAX):
+        import psycopg2
+        import psycopg2.pool
+
+        self.url = url
+        self.errors = (psycopg2.Error,)
+        self._pool = psycopg2.pool.ThreadedConnectionPool(
+            minconn, maxconn, url, sslmode=os.getenv('DATABASE_SSLMODE', 'require'))
+        # ThreadedConnectionPool errors when exhausted, so make callers wait instead
+        self._slots = threading.BoundedSemaphore(maxconn)
+        self._last_used = {}
+        # Names of the statements prepared on each pooled connection
+        self._statements = weakref.WeakKeyDictionary()
+        self._cursor_ids = itertools.count(1)
+        # Change notifications (see change_token)
+        self._listener = None
+        self._listen_lock = threading.Lock()
+        self._notifications = 0
+        self._local_commits = 0
+        self._changed = weakref.WeakSet()
+
+    def _listen(self):
+        import psycopg2
+
+        self._listener = psycopg2.connect(self.url, sslmode=os.getenv('DATABASE_SSLMODE', 'require'))
+        self._listener.autocommit = True
+        self._listener.cursor().execute(f'LISTEN {CHANGES_CHANNEL}')
+
+    def change_token(self):
+        """A value that changes whenever the database may have been written to.
+
+        Writers NOTIFY on commit, and one LISTENing connection per process
+        counts the notifications without blocking; commits this process made
+        are counted as they happen. While neither moves, cached reads can
+        skip checking the database.
+        """
+        import psycopg2
+
+        with self._listen_lock:
+            try:
+                if self._listener is None or self._listener.closed:
+                    self._listen()
+                    # Whatever happened while nobody was listening is unknown
+                    self._notifications += 1
+                if select.select([self._listener], [], [], 0)[0]:
+                    self._listener.poll()
+                    self._notifications += len(self._listener.notifies)
+                    self._listener.notifies.clear()
+            except (psycopg2.Error, OSError):
+                # Try again on the next call; until then every read checks the database
+                if self._listener is not None:
+                    self._listener.close()
+                self._listener = None
+                self._notifications += 1
+            return self._notifications, self._local_commits
+
+    def mark_changed(self, conn):
+        """Note a write in conn's transaction, counted in change_token() once it commits."""
+        self._changed.add(conn)
+
+    def sql(self, query):
+        """Translate ? placeholders to psycopg2's %s style."""
+        return query.replace('?', '%s')
+
+    def _is_healthy(self, conn):
+        if conn.closed:
+            return False
+        if time.monotonic() - self._last_used.get(id(conn), 0) < PG_HEALTH_CHECK_INTERVAL:
+            return True
+        try:
+            with conn.cursor() as c:
+                c.execute('SELECT 1')
+            conn.rollback()
+            return True
+        except Exception:
+            return False
+
+    def _checkout(self):
+        conn = self._pool.getconn()
+        while not self._is_healthy(conn):
+            # Drop the dead connection and let the pool open a fresh one
+            self._last_used.pop(id(conn), None)
+            self._pool.putconn(conn, close=True)
+            conn = self._pool.getconn()
+        return conn
+
+    @contextmanager
+    def connection(self):
+        """Borrow a pooled connection; commits on success, rolls back on error."""
+        with self._slots:
+            conn = self._checkout()
+            try:
+                yield conn
+                conn.commit()
+                if conn in self._changed:
+                    with self._listen_lock:
+                        self._local_commits += 1
+            except Exception:
+                if not conn.closed:
+                    conn.rollback()
+                raise
+            finally:
+                self._changed.discard(conn)
+                self._last_used[id(conn)] = time.monotonic()
+                self._pool.putconn(conn, close=bool(conn.closed))
+
+    def read_frame(self, conn, query, params=()):
+        """Run a SELECT (? placeholders) into a DataFrame through a named server-side cursor.
+
+        Rows arrive PG_FETCH_SIZE at a time and are turned into a frame per
+        batch, so neither libpq nor Python ever holds the whole result as tuples.
+        """
+        import pandas as pd
+        frames = []
+        with conn.cursor(name=f'read_{next(self._cursor_ids)}') as c:
+            c.execute(self.sql(query), params)
+            while True:
+                rows = c.fetchmany(PG_FETCH_SIZE)
+                columns = [col[0] for col in c.description]
+                if rows or not frames:
+                    frames.append(pd.DataFrame.from_records(rows, columns=columns, coerce_float=True))
+                if len(rows) < PG_FETCH_SIZE:
+                    break
+        return frames[0] if len(frames) == 1 else pd.concat(frames, ignore_index=True)
+
+    def _prepared(self, conn, name, query):
+        """Prepare query (? placeholders) as `name` on conn if it isn't yet; returns the EXECUTE statement."""
+        statements = self._statements.setdefault(conn, {})
+        count = query.count('?')
+        if name not in statements:
+            numbers = itertools.count(1)
+            conn.cursor().execute(f"PREPARE {name} AS {re.sub(r'[?]', lambda m: f'${next(numbers)}', query)}")
+            statements[name] = f"EXECUTE {name} ({', '.join(['%s'] * count)})" if count else f'EXECUTE {name}'
+        return statements[name]
+
+    def execute(self, conn, name, query, params=()):
+        """Run one of the app's repeated write statements and return its cursor.
+
+        The statement is parsed and planned once per connection under `name`
+        and then only executed, so each name must always go with the same query.
+        """
+        c = conn.cursor()
+        c.execute(self._prepared(conn, name, query), params)
+        return c
+
+    def executemany(self, conn, name, query, rows):
+        """Run a repeated write statement once per row, PG_BATCH_SIZE executions per round trip."""
+        from psycopg2.extras import execute_batch
+
+        execute_batch(conn.cursor(), self._prepared(conn, name, query), list(rows), page_size=PG_BATCH_SIZE)
+
+    def insert_frame(self, conn, table, frame):
+        """Insert frame's rows into table (columns named as in the table) with one COPY."""
+        buffer = io.StringIO()
+        frame.to_csv(buffer, index=False, header=False, na_rep='\\N')
+        buffer.seek(0)
+        conn.cursor().copy_expert(f"COPY {table} ({', '.join(frame.columns)}) FROM STDIN WITH (FORMAT csv, NULL '\\N')", buffer)
+
+    def close(self):
+        with self._listen_lock:
+            if self._listener is not None:
+                self._listener.close()
+                self._listener = None
+        self._pool.closeall()
+
+
+def get_database(url):
+    """Return the shared database object for a DATABASE_URL, creating it on first use."""
+    with _databases_lock:
+        db = _databases.get(url)
+        if db is None:
+            if is_postgres_url(url):
+                db = PostgresDatabase(url)
+            else:
+                db = SQLiteDatabase(url)
+            _databases[url] = db
+        return db
@@ -0,0 +1,77 @@
+import streamlit as st
+import profiling
+import warmup
+import writer
+
+# Hidden diagnostics view, opened by adding ?diagnostics to the main page's
+# URL. Timings need BETS_PROFILING; the startup breakdown and the writer's
+# group commit counts are always kept.
+# It isn't in pages/ so it stays out of the sidebar.
+
+
+def _p50(seconds):
+    return seconds.quantile(0.5)
+
+
+def _p95(seconds):
+    return seconds.quantile(0.95)
+
+
+def show_diagnostics():
+    """Render the startup breakdown, group commits, latency percentiles, the slowest queries and the cache hit rate."""
+    import pandas as pd
+
+    st.title("Diagnostics")
+    st.subheader("Startup (s)")
+    startup_df = pd.DataFrame(warmup.startup_times())
+    if startup_df.empty:
+        st.write("No startup stages recorded.")
+    else:
+        st.dataframe(startup_df.round(3), hide_index=True, width=1000)
+
+    st.subheader("Group Commits")
+    writes_df = pd.DataFrame(writer.writer_stats())
+    if writes_df.empty:
+        st.write("No bets written since the app started.")
+    else:
+        st.dataframe(writes_df, hide_index=True, width=1000)
+
+    if not profiling.ENABLED:
+        st.write("Profiling is off. Set BETS_PROFILING=1 and restart the app to record timings.")
+        return
+    if st.button("Reset"):
+        profiling.reset()
+
+    spans_df = pd.DataFrame(profiling.spans())
+    if spans_df.empty:
+        st.write("Nothing recorded yet. Open a page, then come back.")
+        return
+    spans_df['ms'] = spans_df['seconds'] * 1000
+
+    # Wall time of each rerun, from its first span starting to its last one ending
+    spans_df['started'] = spans_df['at'] - spans_df['seconds']
+    reruns = spans_df.groupby(['page', 'run']).agg(started=('started', 'min'), ended=('at', 'max'))
+    reruns['ms'] = (reruns['ended'] - reruns['started']) * 1000
+    st.subheader("Reruns by Page (ms)")
+    st.dataframe(reruns.groupby('page')['ms'].agg(['count', _p50, _p95, 'max']).rename(
+        columns={'_p50': 'p50', '_p95': 'p95'}), width=1000)
+
+    st.subheader("Queries, Transforms and Renders (ms)")
+    latency = spans_df.groupby(['page', 'kind', 'name']).agg(
+        count=('ms', 'count'), p50=('ms', _p50), p95=('ms', _p95), max=('ms', 'max'), rows=('rows', 'mean'))
+    st.dataframe(latency.sort_values('p95', ascending=False), width=1000)
+
+    st.subheader("Slowest Queries")
+    queries = spans_df[spans_df['kind'] == 'query']
+    st.dataframe(queries.nlargest(20, 'ms')[['page', 'name', 'detail', 'rows', 'ms']], hide_index=True, width=1000)
+
+    st.subheader("Cache Hit Rate")
+    counts = pd.DataFrame(profiling.cache_counts(), index=['hits', 'misses']).T
+    if counts.empty:
+        st.write("No cache lookups recorded.")
+    else:
+        total = counts.sum()
+        st.write(f"Overall: {total['hits'] / (total['hits'] + total['misses']) * 100:.1f}% "
+                 f"({int(total['hits'])} hits, {int(total['misses'])} misses)")
+        counts['hit rate'] = (counts['hits'] / (counts['hits'] + counts['misses']) * 100).map(lambda x: f"{x:.1f}%")
+        st.dataframe(counts, width=1000)
@@ -1,36 +1,28 @@
-import sqlite3
+from bets_data import bump_version, clear_cache, prepare
+from db import get_database
+from partitions import drop_bets
 
 
 def reset_database():
+    # Connect to SQLite database
+    db = get_database('test_db.sqlite')
     try:
-        # Connect to SQLite database
-        conn = sqlite3.connect('test_db.sqlite')
-        c = conn.cursor()
-        
-        # Drop existing table
-        c.execute('DROP TABLE IF EXISTS bets')
-        conn.commit()
-        
-        # Recreate the table with the updated schema
-        c.execute('''
-        CREATE TABLE IF NOT EXISTS bets (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            Date TEXT,
-            Week INTEGER,
-            Expert TEXT,
-            Team_Player TEXT,
-            Pick TEXT,
-            Type TEXT,
-            Side TEXT,
-            Wager REAL,
-            Odds INTEGER,
-            Outcome TEXT,
-            Dollars REAL
-        )
-        ''')
-        conn.commit()
+        # Drop existing bets and their season files (and the rollups and season records built from them)
+        drop_bets(db)
+        with db.connection() as conn:
+            c = conn.cursor()
+            c.execute('DROP TABLE IF EXISTS bet_rollups')
+            c.execute('DROP TABLE IF EXISTS bankroll_ledger')
+            c.execute('DROP TABLE IF EXISTS closed_seasons')
+        clear_cache(db)
+
+        # Recreate the tables with the updated schema and its indexes
+        prepare(db)
+        # Let any running app know its cached data is stale
+        with db.connection() as conn:
+            bump_version(db, conn, reset=True)
     finally:
-        conn.close()
+        db.close()
 
 # Call this function to reset the database
 reset_database()
\ No newline at end of file
@@ -0,0 +1,51 @@
+import os
+import streamlit as st
+from bankroll import bankroll_curves, bankroll_figure
+from db import get_database
+from profiling import start_run, timed
+
+# Fetch the DATABASE_URL from environment variables
+DATABASE_URL = os.getenv('DATABASE_URL', 'C:/Users/sethmiller_ryanlawn/OneDrive - Ryan Lawn and Tree/Desktop/Home/NFL/NFL_Bets_Tracker_v1/test_db.sqlite')
+
+# Check if DATABASE_URL is available
+if not DATABASE_URL:
+    st.error("DATABASE_URL environment variable not set.")
+    st.stop()
+
+# Shared, process-wide database connection
+try:
+    db = get_database(DATABASE_URL)
+except Exception as e:
+    st.error(f"Failed to connect to the database: {e}")
+    st.stop()
+
+start_run('page3')
+
+st.title("Bankroll")
+
+col1, col2 = st.columns(2)
+period = col1.radio("Points", ["By Date", "By Week"], horizontal=True)
+per_season = col2.checkbox("Start each season at 0")
+
+# Running totals come from the bankroll ledger, cached until the bets table changes
+with timed('transform', 'bankroll_curves'):
+    curves = bankroll_curves(db, 'day' if period == "By Date" else 'week')
+
+if curves.empty:
+    st.write("No settled bets yet.")
+else:
+    all_seasons = sorted(curves['season'].unique())
+    seasons = st.multiselect("Seasons", all_seasons, default=all_seasons)
+    experts = st.multiselect("Experts", sorted(curves['Expert'].unique()))
+    if experts:
+        curves = curves[curves['Expert'].isin(experts)]
+
+    with timed('render', 'bankroll chart') as span:
+        span.rows = len(curves)
+        st.plotly_chart(bankroll_figure(curves, seasons, per_season), use_container_width=True)
+
+    # Where each expert stands at the end of the selected seasons
+    st.subheader("Bankroll by Expert")
+    latest = curves[curves['season'].isin(seasons)].groupby('Expert').last()
+    st.dataframe(latest[['season', 'Week', 'bankroll', 'season_bankroll']].rename(
+        columns={'bankroll': 'Bankroll', 'season_bankroll': 'Season Bankroll'}), width=1000)
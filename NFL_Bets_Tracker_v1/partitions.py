@@ -0,0 +1,339 @@
+import os
+from schema import (
+    BETS_DDL, DROPPED_INDEXES, INDEXES, PG_ID_INDEX_DDL, PG_SOURCE_ID_INDEX_DDL, STORED_COLUMNS,
+    has_unpartitioned_bets, index_ddl, migrate_bets_table, source_id_index_ddl,
+)
+from seasons import current_season
+
+# Bets are stored one season per partition, so queries for a season (the
+# current one above all) only touch that season's rows, and closing a
+# season drops its partition instead of deleting its rows.
+#
+# Postgres: bets is partitioned BY LIST (season), with a bets_<season>
+# partition per season and bets_undated (the DEFAULT partition) for bets
+# without a date. Postgres routes writes and prunes reads by itself.
+#
+# SQLite: each season's bets are in their own table, bets_<season>, in the
+# main database file, and a view named bets unions them, so reads are
+# written as before; writes go to the season's table through bets_table().
+# Keeping them in one file means a write to a season's table commits
+# atomically with the rollups, ledger and version bump next to it.
+
+# Table names of SQLite partitions
+SQLITE_PARTITIONS_SQL = '''
+SELECT name FROM main.sqlite_master
+WHERE type = 'table' AND (name = 'bets_undated' OR name GLOB 'bets_[0-9]*')
+ORDER BY name
+'''
+
+# The last bet id handed out on SQLite. Ids can't come from the tables
+# themselves: a closed season's table is dropped, and its ids (still in its
+# snapshot) must not be handed out again. Postgres has the bets sequence.
+BET_IDS_DDL = '''
+CREATE TABLE IF NOT EXISTS bet_ids (
+    name TEXT PRIMARY KEY,
+    last_id INTEGER NOT NULL
+)
+'''
+
+# Bet ids looked up per query when routing writes by id
+ROUTE_BATCH_SIZE = 500
+
+# Postgres partitions already created, per database URL
+_created = {}
+
+
+def partition_name(season):
+    """bets_<season>, or bets_undated for bets without a season."""
+    if season is None or season != season:
+        return 'bets_undated'
+    return f'bets_{int(season)}'
+
+
+def bets_table(db, season):
+    """The table a bet of `season` is written to: bets on Postgres (which routes it), its season's table on SQLite."""
+    if db.backend == 'postgres':
+        return 'bets'
+    return partition_name(season)
+
+
+def _partitions(conn):
+    return [row[0] for row in conn.execute(SQLITE_PARTITIONS_SQL)]
+
+
+def _attached(conn):
+    return {row[1] for row in conn.execute('PRAGMA database_list')} - {'main', 'temp'}
+
+
+def _begin(conn):
+    # sqlite3 only opens a transaction by itself before INSERT/UPDATE/DELETE,
+    # so CREATE and DROP would otherwise each commit on their own
+    if not conn.in_transaction:
+        conn.execute('BEGIN')
+
+
+def _create_partition(conn, name):
+    conn.execute(BETS_DDL['sqlite'].format(table=f'main.{name}'))
+    for ddl in index_ddl(name) + [source_id_index_ddl(name)]:
+        conn.execute(ddl)
+
+
+def _view_sql(conn):
+    """The bets view over every SQLite partition, or None if there are none."""
+    columns = ', '.join(STORED_COLUMNS)
+    names = _partitions(conn)
+    if not names:
+        return None
+    return 'CREATE VIEW bets AS ' + ' UNION ALL '.join(f'SELECT {columns} FROM {name}' for name in names)
+
+
+def _create_view(conn):
+    """(Re)create the bets view over every SQLite partition."""
+    view_sql = _view_sql(conn)
+    conn.execute('DROP VIEW IF EXISTS main.bets')
+    if view_sql:
+        conn.execute(view_sql)
+
+
+def commits_atomically(db, conn):
+    """True if a write to the bets commits in one go with the rest of the
+    transaction: always on Postgres, and on SQLite while no other database
+    file is attached (as in the layout before the season tables moved into
+    the main file), since SQLite doesn't commit atomically across WAL files."""
+    return db.backend == 'postgres' or not _attached(conn)
+
+
+def ensure_partitions(db, conn, seasons):
+    """Create the partitions for seasons that don't have one yet, in the caller's transaction."""
+    names = {partition_name(season): season for season in seasons}
+    if db.backend == 'postgres':
+        created = _created.setdefault(db.url, set())
+        c = conn.cursor()
+        for name, season in names.items():
+            if name not in created and name != 'bets_undated':
+                c.execute(f'CREATE TABLE IF NOT EXISTS {name} PARTITION OF bets FOR VALUES IN ({int(season)})')
+            created.add(name)
+        return
+
+    missing = sorted(names.keys() - set(_partitions(conn)))
+    if not missing:
+        return
+    _begin(conn)
+    for name in missing:
+        _create_partition(conn, name)
+    _create_view(conn)
+
+
+def _partition_postgres(conn):
+    """Move a plain Postgres bets table into the partitioned layout. Returns rows moved."""
+    c = conn.cursor()
+    columns = ', '.join(STORED_COLUMNS)
+    for name in list(INDEXES) + DROPPED_INDEXES:
+        c.execute(f'DROP INDEX IF EXISTS {name}')
+    c.execute('ALTER TABLE bets RENAME TO bets_unpartitioned')
+    c.execute(BETS_DDL['postgres'].format(table='bets'))
+    c.execute('CREATE TABLE IF NOT EXISTS bets_undated PARTITION OF bets DEFAULT')
+    c.execute('SELECT DISTINCT season FROM bets_unpartitioned WHERE season IS NOT NULL')
+    for (season,) in c.fetchall():
+        c.execute(f'CREATE TABLE IF NOT EXISTS {partition_name(season)} PARTITION OF bets FOR VALUES IN ({int(season)})')
+    c.execute(f'INSERT INTO bets ({columns}) SELECT {columns} FROM bets_unpartitioned')
+    moved = c.rowcount
+    c.execute("SELECT setval(pg_get_serial_sequence('bets', 'id'), COALESCE(MAX(id), 1)) FROM bets")
+    c.execute('DROP TABLE bets_unpartitioned')
+    return moved
+
+
+def _partition_sqlite(conn):
+    """Move the plain bets table into per-season tables, in one transaction. Returns rows moved."""
+    columns = ', '.join(STORED_COLUMNS)
+    _begin(conn)
+    moved = 0
+    for (season,) in conn.execute('SELECT DISTINCT season FROM main.bets').fetchall():
+        name = partition_name(season)
+        where, params = ('season IS NULL', ()) if season is None else ('season = ?', (season,))
+        _create_partition(conn, name)
+        moved += conn.execute(f'INSERT INTO {name} ({columns}) SELECT {columns} FROM main.bets WHERE {where}', params).rowcount
+    conn.execute('DROP TABLE main.bets')
+    return moved
+
+
+def _merge_partition_files(db, conn):
+    """Move bets out of the per-season files earlier versions attached, into
+    the main file's tables. Returns rows moved.
+
+    Each file is attached on its own and merged in its own transaction, so
+    any number of seasons fits under SQLite's limit on attached files.
+    """
+    registered = conn.execute("SELECT 1 FROM main.sqlite_master WHERE type = 'table' AND name = 'bet_partitions'").fetchone()
+    if registered is None:
+        return 0
+    conn.commit()
+    conn.execute('DROP VIEW IF EXISTS temp.bets')
+    for name in _attached(conn):
+        conn.execute(f'DETACH DATABASE {name}')
+    # The files predate source_id; their rows were imported with the sheet's ID as their id
+    columns = ', '.join(col for col in STORED_COLUMNS if col != 'source_id')
+    moved = 0
+    for name, path in conn.execute('SELECT name, path FROM bet_partitions').fetchall():
+        path = os.path.join(os.path.dirname(db.path), path)
+        if os.path.exists(path):
+            conn.execute('ATTACH DATABASE ? AS legacy', (path,))
+        try:
+            _begin(conn)
+            if os.path.exists(path):
+                _create_partition(conn, name)
+                moved += conn.execute(f'INSERT INTO main.{name} ({columns}) SELECT {columns} FROM legacy.bets').rowcount
+                conn.execute(f'UPDATE main.{name} SET source_id = id WHERE source_id IS NULL')
+            conn.execute('DELETE FROM bet_partitions WHERE name = ?', (name,))
+            _create_view(conn)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            if 'legacy' in _attached(conn):
+                conn.execute('DETACH DATABASE legacy')
+        _remove_file(path)
+    conn.execute('DROP TABLE bet_partitions')
+    conn.commit()
+    return moved
+
+
+def _remove_file(path):
+    # A file another process still has open (e.g. on Windows) is left in place
+    for suffix in ['', '-wal', '-shm']:
+        try:
+            os.remove(path + suffix)
+        except OSError:
+            pass
+
+
+def ensure_partitioned(db, conn):
+    """Split a bets table from before partitioning into partitions, and make
+    sure the current season has one. Returns how many rows were moved."""
+    moved = 0
+    if db.backend == 'postgres':
+        if has_unpartitioned_bets(db, conn):
+            moved = _partition_postgres(conn)
+        c = conn.cursor()
+        c.execute('CREATE TABLE IF NOT EXISTS bets_undated PARTITION OF bets DEFAULT')
+        for ddl in index_ddl() + [PG_ID_INDEX_DDL, PG_SOURCE_ID_INDEX_DDL]:
+            c.execute(ddl)
+        for name in DROPPED_INDEXES:
+            c.execute(f'DROP INDEX IF EXISTS {name}')
+    else:
+        moved = _merge_partition_files(db, conn)
+        if has_unpartitioned_bets(db, conn):
+            moved += _partition_sqlite(conn)
+        _begin(conn)
+        for name in _partitions(conn):
+            migrate_bets_table(db, conn, f'main.{name}')
+            # Indexes added since the partition was made
+            for ddl in index_ddl(name) + [source_id_index_ddl(name)]:
+                conn.execute(ddl)
+        # Rebuilt when missing or from before a column was added
+        view = conn.execute("SELECT sql FROM main.sqlite_master WHERE type = 'view' AND name = 'bets'").fetchone()
+        if view is None or view[0] != _view_sql(conn):
+            _create_view(conn)
+        _ensure_bet_ids(conn)
+    ensure_partitions(db, conn, [current_season()])
+    return moved
+
+
+def _ensure_bet_ids(conn):
+    """Create the SQLite bet id counter if missing, starting it past every id
+    in the season tables and in closed seasons' snapshots."""
+    conn.execute(BET_IDS_DDL)
+    if conn.execute("SELECT 1 FROM bet_ids WHERE name = 'bets'").fetchone() is not None:
+        return
+    # Imported here: season_archive builds on bets_data, which builds on this module
+    from season_archive import load_snapshot
+
+    # MAX(id) on each table is a rowid lookup; over the view it would be a scan
+    last_ids = [conn.execute(f'SELECT COALESCE(MAX(id), 0) FROM {name}').fetchone()[0] for name in _partitions(conn)]
+    for (path,) in conn.execute('SELECT path FROM closed_seasons').fetchall():
+        if os.path.exists(path):
+            ids = load_snapshot(path)['id']
+            last_ids.append(int(ids.max()) if len(ids) else 0)
+    conn.execute("INSERT INTO bet_ids (name, last_id) VALUES ('bets', ?)", (max(last_ids, default=0),))
+
+
+def next_bet_ids(db, conn, count):
+    """`count` new bet ids, never handed out before, in the caller's transaction."""
+    c = conn.cursor()
+    if db.backend == 'postgres':
+        c.execute("SELECT nextval(pg_get_serial_sequence('bets', 'id')) FROM generate_series(1, %s)", (count,))
+        return [row[0] for row in c.fetchall()]
+    c.execute("UPDATE bet_ids SET last_id = last_id + ? WHERE name = 'bets' RETURNING last_id", (count,))
+    last_id = c.fetchone()[0]
+    return list(range(last_id - count + 1, last_id + 1))
+
+
+def next_bet_id(db, conn):
+    """An id for a new bet, unique across every partition and closed season."""
+    return next_bet_ids(db, conn, 1)[0]
+
+
+def route_bets(db, conn, bet_ids):
+    """{table: [bet ids]} for the partitions holding the given bets (bets that don't exist are left out)."""
+    bet_ids = [int(bet_id) for bet_id in bet_ids]
+    routes = {}
+    c = conn.cursor()
+    for start in range(0, len(bet_ids), ROUTE_BATCH_SIZE):
+        batch = bet_ids[start:start + ROUTE_BATCH_SIZE]
+        c.execute(db.sql(f"SELECT id, season FROM bets WHERE id IN ({', '.join('?' * len(batch))})"), batch)
+        for bet_id, season in c.fetchall():
+            routes.setdefault(bets_table(db, season), []).append(bet_id)
+    return routes
+
+
+def update_bets(db, conn, name, assignments, rows):
+    """UPDATE ... SET `assignments` WHERE id = ? for each row of parameters (the id last), in each bet's partition."""
+    rows = [tuple(row) for row in rows]
+    tables = {}
+    for table, bet_ids in route_bets(db, conn, [row[-1] for row in rows]).items():
+        tables.update(dict.fromkeys(bet_ids, table))
+    by_table = {}
+    for row in rows:
+        if int(row[-1]) in tables:
+            by_table.setdefault(tables[int(row[-1])], []).append(row)
+    for table, table_rows in by_table.items():
+        db.executemany(conn, name, f'UPDATE {table} SET {assignments} WHERE id = ?', table_rows)
+
+
+def delete_bets(db, conn, bet_ids):
+    """Delete bets by id from their partitions."""
+    for table, ids in route_bets(db, conn, bet_ids).items():
+        db.executemany(conn, 'delete_bet', f'DELETE FROM {table} WHERE id = ?', [(bet_id,) for bet_id in ids])
+
+
+def drop_partition(db, conn, season):
+    """Drop a closed season's partition in the caller's transaction."""
+    name = partition_name(season)
+    if db.backend == 'postgres':
+        c = conn.cursor()
+        c.execute('SELECT to_regclass(%s)', (name,))
+        if c.fetchone()[0] is not None:
+            c.execute(f'ALTER TABLE bets DETACH PARTITION {name}')
+            c.execute(f'DROP TABLE {name}')
+        _created.get(db.url, set()).discard(name)
+    elif name in _partitions(conn):
+        _begin(conn)
+        conn.execute(f'DROP TABLE main.{name}')
+        _create_view(conn)
+
+
+def drop_bets(db):
+    """Drop the bets table and every partition."""
+    _created.pop(db.url, None)
+    with db.connection() as conn:
+        if db.backend == 'postgres':
+            conn.cursor().execute('DROP TABLE IF EXISTS bets')
+            return
+        _merge_partition_files(db, conn)
+        _begin(conn)
+        conn.execute('DROP VIEW IF EXISTS main.bets')
+        conn.execute('DROP TABLE IF EXISTS main.bets')
+        conn.execute('DROP TABLE IF EXISTS bet_ids')
+        for name in _partitions(conn):
+            conn.execute(f'DROP TABLE main.{name}')
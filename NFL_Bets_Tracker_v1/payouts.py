@@ -0,0 +1,90 @@
+import argparse
+import os
+import time
+import numpy as np
+import pandas as pd
+from bets_data import bump_version, prepare
+from partitions import update_bets
+from rollups import apply_bets
+
+# Payout math for American odds, on whole columns at once. Every path that
+# writes Dollars (the add-bet forms, settling, the CSV import and the
+# recompute command below) goes through bet_dollars().
+
+
+def decimal_odds(odds):
+    """American odds -> decimal odds (total return per 1 staked).
+
+    +150 pays 1.5 per 1 and -110 pays 100/110; odds of 0 are treated as even
+    money, as the add-bet form always has.
+    """
+    odds = np.asarray(odds, dtype=float)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(odds > 0, 1 + odds / 100, np.where(odds < 0, 1 - 100 / odds, 2.0))
+
+
+def implied_probability(odds):
+    """Break-even win probability of American odds (vig included)."""
+    return 1 / decimal_odds(odds)
+
+
+def potential_profit(odds, wagers):
+    """What each bet wins, not counting the returned stake."""
+    return np.asarray(wagers, dtype=float) * (decimal_odds(odds) - 1)
+
+
+def settled_pnl(outcomes, wagers, odds):
+    """Profit/loss of settled bets: Won the potential profit, Lost the wager, Push 0."""
+    outcomes = np.asarray(outcomes)
+    wagers = np.asarray(wagers, dtype=float)
+    return np.select([outcomes == 'Won', outcomes == 'Lost'], [potential_profit(odds, wagers), -wagers], default=0.0)
+
+
+def bet_dollars(outcomes, wagers, odds):
+    """The ledger's Dollars column, rounded to cents.
+
+    Settled bets hold their profit/loss; pending bets hold what they stand
+    to win.
+    """
+    outcomes = np.asarray(outcomes)
+    dollars = np.where(outcomes == 'Pending', potential_profit(odds, wagers), settled_pnl(outcomes, wagers, odds))
+    return np.round(dollars, 2)
+
+
+def recompute_dollars(db):
+    """Reprice every bet with odds and a wager, writing back only rows whose Dollars changed.
+
+    The rollups are adjusted for the changed rows in the same transaction.
+    Returns (rows checked, rows changed).
+    """
+    prepare(db)
+    with db.connection() as conn:
+        bets_df = db.read_frame(
+            conn, 'SELECT id AS "id", Wager AS "Wager", Odds AS "Odds", Outcome AS "Outcome", Dollars AS "Dollars" '
+            'FROM bets WHERE Odds IS NOT NULL AND Wager IS NOT NULL')
+        wagers = pd.to_numeric(bets_df['Wager'], errors='coerce').to_numpy(dtype=float)
+        odds = pd.to_numeric(bets_df['Odds'], errors='coerce').to_numpy(dtype=float)
+        current = pd.to_numeric(bets_df['Dollars'], errors='coerce').to_numpy(dtype=float)
+        dollars = bet_dollars(bets_df['Outcome'].to_numpy(), wagers, odds)
+
+        changed = ~np.isclose(current, dollars) & ~np.isnan(dollars)
+        bet_ids = bets_df['id'].to_numpy()[changed].tolist()
+        if bet_ids:
+            revision = bump_version(db, conn)
+            repriced = [(amount, revision, bet_id) for amount, bet_id in zip(dollars[changed].tolist(), bet_ids)]
+            apply_bets(db, conn, bet_ids, -1)
+            update_bets(db, conn, 'reprice_bet', 'Dollars = ?, revision = ?', repriced)
+            apply_bets(db, conn, bet_ids, 1)
+    return len(bets_df), len(bet_ids)
+
+
+if __name__ == '__main__':
+    from db import get_database
+
+    parser = argparse.ArgumentParser(description="Recompute every bet's Dollars from its wager, odds and outcome.")
+    parser.add_argument('database_url', nargs='?', default=os.getenv('DATABASE_URL', 'test_db.sqlite'))
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    checked, changed = recompute_dollars(get_database(args.database_url))
+    print(f"Repriced {checked} bets, {changed} changed, in {time.perf_counter() - started:.2f}s.")
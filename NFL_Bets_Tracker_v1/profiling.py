@@ -0,0 +1,111 @@
+import itertools
+import os
+import threading
+import time
+from collections import deque
+
+# Timers for queries, DataFrame transforms and renders, recorded per page and
+# per rerun. Off unless BETS_PROFILING is set; when off, timed() hands back a
+# shared no-op span, so an instrumented block costs one function call.
+ENABLED = os.getenv('BETS_PROFILING', '').lower() in ('1', 'true', 'yes', 'on')
+
+# Most recent spans kept in memory for the diagnostics view
+MAX_SPANS = int(os.getenv('BETS_PROFILING_MAX_SPANS', '20000'))
+
+_spans = deque(maxlen=MAX_SPANS)
+_cache_counts = {}
+_lock = threading.Lock()
+_run_ids = itertools.count(1)
+
+# Streamlit runs each rerun of a page on one thread, so the current page and
+# rerun are tracked per thread
+_current = threading.local()
+
+
+class Span:
+    """Times one block; set .rows inside it to record how many rows it handled."""
+
+    __slots__ = ('kind', 'name', 'detail', 'rows', 'started')
+
+    def __init__(self, kind, name, detail=''):
+        self.kind = kind
+        self.name = name
+        self.detail = detail
+        self.rows = None
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        seconds = time.perf_counter() - self.started
+        with _lock:
+            _spans.append({
+                'page': getattr(_current, 'page', None),
+                'run': getattr(_current, 'run', None),
+                'kind': self.kind,
+                'name': self.name,
+                'detail': self.detail,
+                'rows': self.rows,
+                'seconds': seconds,
+                'at': time.time(),
+            })
+        return False
+
+
+class _NullSpan:
+    """Stands in for Span when profiling is off."""
+
+    rows = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+def timed(kind, name, detail=''):
+    """Time a 'query', 'transform' or 'render' block: `with timed('render', 'chart') as span:`."""
+    if not ENABLED:
+        return _NULL_SPAN
+    return Span(kind, name, detail)
+
+
+def start_run(page):
+    """Mark the start of a page rerun; later spans on this thread are attributed to it."""
+    if not ENABLED:
+        return
+    _current.page = page
+    _current.run = next(_run_ids)
+
+
+def record_cache(name, hit):
+    """Count a cache lookup for the hit rate."""
+    if not ENABLED:
+        return
+    with _lock:
+        counts = _cache_counts.setdefault(name, [0, 0])
+        counts[0 if hit else 1] += 1
+
+
+def spans():
+    """A copy of the recorded spans, oldest first."""
+    with _lock:
+        return list(_spans)
+
+
+def cache_counts():
+    """{cache name: (hits, misses)} since the process started."""
+    with _lock:
+        return {name: tuple(counts) for name, counts in _cache_counts.items()}
+
+
+def reset():
+    """Drop everything recorded so far."""
+    with _lock:
+        _spans.clear()
+        _cache_counts.clear()
@@ -0,0 +1,228 @@
+import argparse
+import html
+import os
+import re
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from bankroll import bankroll_curves, bankroll_figure
+from db import get_database
+from season_charts import CHARTS
+from summary_queries import SUM_COLUMNS, expert_season_summary, expert_table, expert_week_summary, season_chart_data, season_totals
+
+# Writes the weekly recap without the Streamlit app, e.g. from cron:
+#   python reports.py reports/ --database-url $DATABASE_URL
+#
+# Every season, every week and every expert gets a report: an HTML page
+# (tables and the app's Plotly charts), CSVs of its tables and a PNG chart.
+# The parent process reads the rollups, bankroll ledger and chart data once;
+# the reports are then rendered in parallel by a process pool, which needs
+# no database connection.
+
+FORMATS = ['html', 'csv', 'png']
+
+# Default number of rendering processes
+WORKERS = int(os.getenv('REPORT_WORKERS', str(os.cpu_count() or 1)))
+
+PAGE_TEMPLATE = '''<!DOCTYPE html>
+<html>
+<head><meta charset="utf-8"><title>{title}</title>
+<style>body {{ font-family: sans-serif; margin: 2em; }} table {{ border-collapse: collapse; }} td, th {{ padding: 4px 8px; border: 1px solid #ddd; text-align: right; }}</style>
+</head>
+<body>
+<h1>{title}</h1>
+{body}
+</body>
+</html>
+'''
+
+
+def format_currency(amount):
+    """Format a number as currency."""
+    return '${:,.2f}'.format(float(amount))
+
+
+def _slug(name):
+    return re.sub(r'[^A-Za-z0-9]+', '_', str(name)).strip('_') or 'unknown'
+
+
+def _totals_html(totals):
+    return (f"<p>Total Bets: {int(totals['total_bets'])} &middot; Wins: {int(totals['won_bets'])} &middot; "
+            f"Losses: {int(totals['lost_bets'])} &middot; Win Percentage: {totals['win_percentage']:.2f}%</p>"
+            f"<p>Profit: {format_currency(totals['dollars'])} &middot; Wagered: {format_currency(totals['wagered'])} &middot; "
+            f"ROI: {totals['roi']:.2f}%</p>")
+
+
+def _figures_html(figs):
+    # plotly.js is loaded once per page, from the CDN
+    return ''.join(fig.to_html(full_html=False, include_plotlyjs='cdn' if i == 0 else False) for i, fig in enumerate(figs))
+
+
+def _write_page(path, title, sections, figs=()):
+    body = ''.join(f'<h2>{html.escape(heading)}</h2>{content}' for heading, content in sections)
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(PAGE_TEMPLATE.format(title=html.escape(title), body=body + _figures_html(figs)))
+    return path
+
+
+def _bar_png(path, values, title, ylabel):
+    # Imported per worker: only the PNG reports need matplotlib
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+
+    fig, ax = plt.subplots(figsize=(8, 4.5))
+    ax.bar(values.index.astype(str), values.to_numpy(), color=['#4682B4' if v >= 0 else 'lightcoral' for v in values])
+    ax.set_title(title)
+    ax.set_ylabel(ylabel)
+    ax.axhline(0, color='grey', linewidth=0.8)
+    ax.tick_params(axis='x', labelrotation=45)
+    fig.tight_layout()
+    fig.savefig(path, dpi=100)
+    plt.close(fig)
+    return path
+
+
+def _line_png(path, curves, title):
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+
+    fig, ax = plt.subplots(figsize=(8, 4.5))
+    for season, season_curve in curves.groupby('season'):
+        ax.plot(season_curve['Date'], season_curve['bankroll'], label=str(season))
+    ax.set_title(title)
+    ax.set_ylabel('Bankroll')
+    ax.axhline(0, color='grey', linewidth=0.8)
+    if curves['season'].nunique() > 1:
+        ax.legend()
+    fig.autofmt_xdate()
+    fig.tight_layout()
+    fig.savefig(path, dpi=100)
+    plt.close(fig)
+    return path
+
+
+def season_report(out_dir, season, summary_df, chart_data, formats):
+    """The Summary page for one season, with page2's charts. Returns the files written."""
+    prefix = os.path.join(out_dir, f'season_{season}')
+    experts = expert_table(summary_df, season).sort_values('Dollars Gained', ascending=False)
+    written = []
+    if 'csv' in formats:
+        experts.to_csv(prefix + '_experts.csv')
+        written.append(prefix + '_experts.csv')
+    if 'html' in formats:
+        figs = [build(chart_data) for _, _, build in CHARTS] if chart_data is not None else []
+        written.append(_write_page(prefix + '.html', f'{season} Season', [
+            ('Totals', _totals_html(season_totals(summary_df, season))),
+            ('Bets by Expert', experts.to_html()),
+        ], figs))
+    if 'png' in formats:
+        written.append(_bar_png(prefix + '.png', experts['Dollars Gained'], f'{season} Season: Profit by Expert', 'Dollars'))
+    return written
+
+
+def week_report(out_dir, season, week, week_df, formats):
+    """Every expert's results for one week of a season. Returns the files written."""
+    prefix = os.path.join(out_dir, f'season_{season}_week_{int(week):02d}')
+    experts = expert_table(week_df).sort_values('Dollars Gained', ascending=False)
+    written = []
+    if 'csv' in formats:
+        experts.to_csv(prefix + '.csv')
+        written.append(prefix + '.csv')
+    if 'html' in formats:
+        written.append(_write_page(prefix + '.html', f'{season} Season, Week {int(week)}', [
+            ('Totals', _totals_html(season_totals(week_df))),
+            ('Bets by Expert', experts.to_html()),
+        ]))
+    if 'png' in formats:
+        written.append(_bar_png(prefix + '.png', experts['Dollars Gained'], f'{season} Week {int(week)}: Profit by Expert', 'Dollars'))
+    return written
+
+
+def expert_report(out_dir, expert, expert_df, curves, formats):
+    """One expert's seasons and bankroll curve. Returns the files written."""
+    prefix = os.path.join(out_dir, f'expert_{_slug(expert)}')
+    seasons = expert_df.set_index('season').sort_index()[SUM_COLUMNS]
+    seasons['win_percentage'] = (seasons['won_bets'] / seasons['total_bets'] * 100).fillna(0).round(2)
+    seasons['roi'] = (seasons['dollars'] / seasons['wagered'].where(seasons['wagered'] > 0) * 100).fillna(0).round(2)
+    written = []
+    if 'csv' in formats:
+        seasons.to_csv(prefix + '_seasons.csv')
+        curves.to_csv(prefix + '_bankroll.csv', index=False)
+        written += [prefix + '_seasons.csv', prefix + '_bankroll.csv']
+    if 'html' in formats:
+        figs = [bankroll_figure(curves)] if not curves.empty else []
+        written.append(_write_page(prefix + '.html', str(expert), [
+            ('Totals', _totals_html(season_totals(expert_df))),
+            ('By Season', seasons.to_html()),
+        ], figs))
+    if 'png' in formats and not curves.empty:
+        written.append(_line_png(prefix + '.png', curves, f'{expert}: Bankroll'))
+    return written
+
+
+def _jobs(db, seasons):
+    """(report function, args) for every report, with the data each one needs."""
+    summary_df = expert_season_summary(db)
+    week_df = expert_week_summary(db)
+    curves = bankroll_curves(db, 'day')
+    if seasons:
+        summary_df = summary_df[summary_df['season'].isin(seasons)]
+        week_df = week_df[week_df['season'].isin(seasons)]
+        curves = curves[curves['season'].isin(seasons)]
+    jobs = []
+    for season in sorted(summary_df['season'].unique()):
+        jobs.append((season_report, (int(season), summary_df, season_chart_data(db, int(season)))))
+    for (season, week), one_week in week_df.groupby(['season', 'Week']):
+        jobs.append((week_report, (int(season), int(week), one_week)))
+    for expert, expert_df in summary_df.groupby('Expert'):
+        jobs.append((expert_report, (expert, expert_df, curves[curves['Expert'] == expert])))
+    return jobs
+
+
+def _write_index(out_dir, written):
+    links = ''.join(f'<li><a href="{html.escape(name)}">{html.escape(name)}</a></li>'
+                    for name in sorted(os.path.basename(path) for path in written if path.endswith('.html')))
+    return _write_page(os.path.join(out_dir, 'index.html'), 'Bets Reports', [('Reports', f'<ul>{links}</ul>')])
+
+
+def generate_reports(db, out_dir, seasons=None, formats=FORMATS, workers=WORKERS):
+    """Write every season, week and expert report into out_dir. Returns the files written.
+
+    The data is read here once; rendering is spread over `workers`
+    processes (1 renders in this process).
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    jobs = _jobs(db, seasons)
+    written = []
+    if workers <= 1:
+        for report, args in jobs:
+            written += report(out_dir, *args, formats)
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(report, out_dir, *args, formats) for report, args in jobs]
+            for future in as_completed(futures):
+                written += future.result()
+    if 'html' in formats:
+        written.append(_write_index(out_dir, written))
+    return written
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Write HTML/CSV/PNG reports for every season, week and expert.")
+    parser.add_argument('out_dir')
+    parser.add_argument('--database-url', default=os.getenv('DATABASE_URL', 'test_db.sqlite'))
+    parser.add_argument('--seasons', type=int, nargs='+', help="only these seasons (default: all)")
+    parser.add_argument('--formats', nargs='+', choices=FORMATS, default=FORMATS)
+    parser.add_argument('--workers', type=int, default=WORKERS)
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    try:
+        written = generate_reports(get_database(args.database_url), args.out_dir, args.seasons, args.formats, args.workers)
+    except Exception as e:
+        # A non-zero exit lets cron report the failure
+        print(f"Could not write the reports: {e}", file=sys.stderr)
+        sys.exit(1)
+    print(f"Wrote {len(written)} files to {args.out_dir} in {time.perf_counter() - started:.1f}s.")
@@ -0,0 +1,187 @@
+import re
+import numpy as np
+import pandas as pd
+from payouts import potential_profit
+
+# What the pending book stands to win or lose, worked out on whole columns
+# with NumPy so it can be redone on every rerun.
+#
+# Bets on the same pick, type and week are one market: every side in it is
+# settled by the same number (the player's yards, the team's margin), so an
+# Over and an Under on it can't both lose. Each side's line is read from the
+# Side column (Over/Under 5.5, a spread like -3.5, moneyline as a spread of
+# 0) and the market's profit/loss is checked just below, on and just above
+# every line, which covers every way it can land. The numbers are whole, so
+# only a whole line can push; a half-point line is checked just below it
+# twice instead. Max win and max loss are then the best and worst of those
+# per market, added up across markets as if every market broke the same way.
+# Bets whose Side has no line (specials, anytime TDs) are markets of their own.
+
+# Over/Under and a line, or a bare spread, at the start of Side
+SIDE_PATTERN = r'^\s*(?P<direction>over|under|o|u)?\s*(?P<line>[+-]?\d+(?:\.\d+)?)'
+
+# How far either side of a line the markets are checked
+LINE_STEP = 1e-6
+
+MARKET_COLUMNS = ['season', 'Week', 'Pick', 'Type']
+
+
+def _stakes(pending_df):
+    """Each bet's wager and what it wins."""
+    wagers = pd.to_numeric(pending_df['Wager'], errors='coerce').fillna(0).to_numpy(dtype=float)
+    odds = pd.to_numeric(pending_df['Odds'], errors='coerce').fillna(0).to_numpy(dtype=float)
+    return wagers, potential_profit(odds, wagers)
+
+
+def _distinct(values, func):
+    """func on the distinct values only (as a string Series), spread back out to every row."""
+    codes, uniques = pd.factorize(values, use_na_sentinel=False)
+    return func(pd.Series(uniques, dtype=object).astype('string')).to_numpy()[codes]
+
+
+def pending_book(pending_df):
+    """The pending bets as arrays: wagers, what each wins, its market code, its side (+1 wins above the line, -1 below) and its line."""
+    wagers, to_win = _stakes(pending_df)
+    line = _distinct(pending_df['Side'], lambda sides: pd.to_numeric(
+        sides.str.extract(SIDE_PATTERN, flags=re.IGNORECASE)['line'], errors='coerce')).astype(float)
+    direction = _distinct(pending_df['Side'], lambda sides: sides.str.extract(
+        SIDE_PATTERN, flags=re.IGNORECASE)['direction'].str.lower().str[0].fillna(''))
+    moneyline = _distinct(pending_df['Type'], lambda types: (
+        types.str.lower().str.replace(' ', '') == 'moneyline').fillna(False)).astype(bool)
+    # A bet wins when the market's number lands on its side of the threshold:
+    # above an Over's line, below an Under's, above minus the spread for ATS
+    sign = np.where(direction == 'u', -1.0, 1.0)
+    threshold = np.where(direction == '', -line, line)
+    threshold = np.where(moneyline & np.isnan(line), 0.0, threshold)
+    linked = ~np.isnan(threshold)
+
+    # Picks and types match whatever their case or stray spaces
+    market = np.zeros(len(pending_df), dtype='int64')
+    for col in MARKET_COLUMNS:
+        codes = pd.factorize(_distinct(pending_df[col], lambda values: values.str.strip().str.lower().fillna('')))[0]
+        market = pd.factorize(market * (codes.max(initial=0) + 1) + codes)[0]
+    # Lineless bets get a market each, after the shared ones
+    market = np.where(linked, market, market.max(initial=0) + 1 + np.arange(len(market)))
+    market = pd.factorize(market)[0]
+    threshold = np.where(linked, threshold, 0.0)
+    return wagers, to_win, market, sign, threshold
+
+
+def _scenarios(wagers, to_win, market, sign, threshold, owner, owners):
+    """Profit/loss in every market scenario, split by owner (e.g. expert code).
+
+    Returns the bets' order (sorted by market), the start of each market's
+    scenarios and a (scenarios x owners) array. Bet i's three scenarios
+    (just below, on and just above its line; just below again for a line the
+    number can't land on) are rows 3i to 3i+2 of the sorted order.
+    """
+    order = np.argsort(market, kind='stable')
+    wagers, to_win, market, sign, threshold, owner = (a[order] for a in (wagers, to_win, market, sign, threshold, owner))
+    counts = np.bincount(market)
+    starts = np.cumsum(counts) - counts
+
+    on_line = np.where(np.mod(threshold, 1) == 0, 0.0, -LINE_STEP)
+    points = np.column_stack([threshold - LINE_STEP, threshold + on_line, threshold + LINE_STEP]).ravel()
+    point_market = np.repeat(market, 3)
+    # Pair every scenario with every bet in its market
+    reps = counts[point_market]
+    pair_point = np.repeat(np.arange(len(points)), reps)
+    pair_bet = np.repeat(starts[point_market] - (np.cumsum(reps) - reps), reps) + np.arange(reps.sum())
+    margin = sign[pair_bet] * (points[pair_point] - threshold[pair_bet])
+    pnl = np.where(margin > 0, to_win[pair_bet], np.where(margin < 0, -wagers[pair_bet], 0.0))
+    by_owner = np.bincount(pair_point * owners + owner[pair_bet], weights=pnl, minlength=len(points) * owners)
+    return order, starts * 3, by_owner.reshape(len(points), owners)
+
+
+def _extremes(scenarios, market_starts):
+    """Best and worst profit/loss of each market (rows) for each owner (columns)."""
+    return np.maximum.reduceat(scenarios, market_starts, axis=0), np.minimum.reduceat(scenarios, market_starts, axis=0)
+
+
+def _by(labels, bets_codes, market_codes, wagers, to_win, market_best, market_worst):
+    """Bets, stakes and summed market extremes per label."""
+    size = len(labels)
+    return pd.DataFrame({
+        'Bets': np.bincount(bets_codes, minlength=size),
+        'At Risk': np.bincount(bets_codes, weights=wagers, minlength=size),
+        'To Win': np.bincount(bets_codes, weights=to_win, minlength=size),
+        'Max Win': np.bincount(market_codes, weights=market_best, minlength=size),
+        'Max Loss': np.bincount(market_codes, weights=market_worst, minlength=size),
+    }, index=labels).round(2)
+
+
+def exposure_matrix(pending_df):
+    """Stakes by expert x pick x type: a dense (experts, picks, types) array per measure.
+
+    Returns the non-empty cells as a frame, biggest stake first.
+    """
+    expert, experts = pd.factorize(pending_df['Expert'].fillna(''))
+    pick, picks = pd.factorize(pending_df['Pick'].fillna(''))
+    bet_type, types = pd.factorize(pending_df['Type'].fillna(''))
+    shape = (len(experts), len(picks), len(types))
+    cell = np.ravel_multi_index((expert, pick, bet_type), shape)
+    wagers, to_win = _stakes(pending_df)
+    size = int(np.prod(shape))
+    bets = np.bincount(cell, minlength=size)
+    filled = np.flatnonzero(bets)
+    e, p, t = np.unravel_index(filled, shape)
+    return pd.DataFrame({
+        'Expert': experts[e],
+        'Pick': picks[p],
+        'Type': types[t],
+        'Bets': bets[filled],
+        'At Risk': np.bincount(cell, weights=wagers, minlength=size)[filled].round(2),
+        'To Win': np.bincount(cell, weights=to_win, minlength=size)[filled].round(2),
+    }).sort_values(['At Risk', 'To Win'], ascending=False, ignore_index=True)
+
+
+def pending_risk(pending_df):
+    """Exposure of the pending bets, or None if there are none.
+
+    Returns a dict: 'totals' (bets, at risk, to win, max win, max loss for
+    the whole book), 'by_expert', 'by_week' and 'by_pick' frames of the same
+    measures, 'sides' (the net position on each side of each market: the
+    market's profit/loss if that side hits or misses) and 'matrix' (see
+    exposure_matrix()).
+    """
+    if pending_df.empty:
+        return None
+    wagers, to_win, market, sign, threshold = pending_book(pending_df)
+    expert, experts = pd.factorize(pending_df['Expert'].fillna(''))
+    order, market_starts, scenarios = _scenarios(wagers, to_win, market, sign, threshold, expert, len(experts))
+    expert_best, expert_worst = _extremes(scenarios, market_starts)
+    total = scenarios.sum(axis=1)
+    best, worst = _extremes(total, market_starts)
+
+    # Each market's week and pick, from its first bet
+    first_bet = order[market_starts // 3]
+    season_week = pd.to_numeric(pending_df['season'], errors='coerce').fillna(0) * 100 + pd.to_numeric(pending_df['Week'], errors='coerce').fillna(0)
+    week, weeks = pd.factorize(season_week.astype(int), sort=True)
+    weeks = [f'{key // 100} Week {key % 100}' for key in weeks]
+    pick, picks = pd.factorize(pending_df['Pick'].fillna(''))
+
+    by_expert = pd.DataFrame({
+        'Bets': np.bincount(expert, minlength=len(experts)),
+        'At Risk': np.bincount(expert, weights=wagers, minlength=len(experts)),
+        'To Win': np.bincount(expert, weights=to_win, minlength=len(experts)),
+        'Max Win': expert_best.sum(axis=0),
+        'Max Loss': expert_worst.sum(axis=0),
+    }, index=pd.Index(experts, name='Expert')).round(2)
+
+    # A side's market profit/loss when the number lands just past its line, or just short of it
+    hit_row = 3 * np.argsort(order) + 1 + sign.astype(int)
+    miss_row = 3 * np.argsort(order) + 1 - sign.astype(int)
+    sides = pending_df[MARKET_COLUMNS + ['Side']].assign(
+        Bets=1, **{'At Risk': wagers, 'To Win': to_win, 'If It Hits': total[hit_row], 'If It Misses': total[miss_row]})
+    sides = sides.groupby(MARKET_COLUMNS + ['Side'], dropna=False, sort=True).agg({
+        'Bets': 'sum', 'At Risk': 'sum', 'To Win': 'sum', 'If It Hits': 'first', 'If It Misses': 'first'}).round(2)
+
+    return {
+        'totals': {'bets': len(pending_df), 'at_risk': round(wagers.sum(), 2), 'to_win': round(to_win.sum(), 2),
+                   'max_win': round(best.sum(), 2), 'max_loss': round(worst.sum(), 2)},
+        'by_expert': by_expert.sort_values('Max Loss'),
+        'by_week': _by(pd.Index(weeks, name='Week'), week, week[first_bet], wagers, to_win, best, worst),
+        'by_pick': _by(pd.Index(picks, name='Pick'), pick, pick[first_bet], wagers, to_win, best, worst).sort_values('Max Loss'),
+        'sides': sides,
+        'matrix': exposure_matrix(pending_df),
+    }
@@ -0,0 +1,185 @@
+import argparse
+import os
+
+# Running totals per season, week, expert and bet type. The write paths keep
+# these in step with the bets table inside the same transaction, so the
+# dashboards can read a few hundred rollup rows instead of the whole ledger.
+ROLLUPS_DDL = '''
+CREATE TABLE IF NOT EXISTS bet_rollups (
+    season INTEGER NOT NULL,
+    week INTEGER NOT NULL,
+    expert TEXT NOT NULL,
+    bet_type TEXT NOT NULL,
+    bets INTEGER NOT NULL DEFAULT 0,
+    wins INTEGER NOT NULL DEFAULT 0,
+    losses INTEGER NOT NULL DEFAULT 0,
+    pending INTEGER NOT NULL DEFAULT 0,
+    wagered REAL NOT NULL DEFAULT 0,
+    dollars REAL NOT NULL DEFAULT 0,
+    pending_wagered REAL NOT NULL DEFAULT 0,
+    pending_dollars REAL NOT NULL DEFAULT 0,
+    PRIMARY KEY (season, week, expert, bet_type)
+)
+'''
+
+# Bets folded into (or out of) the rollups per statement
+APPLY_BATCH_SIZE = 500
+
+ROLLUP_COLUMNS = ['bets', 'wins', 'losses', 'pending', 'wagered', 'dollars', 'pending_wagered', 'pending_dollars']
+
+# Rollup key and measures for bet rows; {agg} is SUM for a rebuild, or a
+# signed SUM when adding/removing a batch of bets.
+_ROLLUP_SELECT = '''
+SELECT
+    COALESCE(season, 0),
+    COALESCE(Week, 0),
+    COALESCE(Expert, ''),
+    COALESCE(Type, ''),
+    {agg}(1),
+    {agg}(CASE WHEN Outcome = 'Won' THEN 1 ELSE 0 END),
+    {agg}(CASE WHEN Outcome = 'Lost' THEN 1 ELSE 0 END),
+    {agg}(CASE WHEN Outcome = 'Pending' THEN 1 ELSE 0 END),
+    {agg}(CASE WHEN Outcome IN ('Won', 'Lost') THEN COALESCE(Wager, 0) ELSE 0 END),
+    {agg}(CASE WHEN Outcome IN ('Won', 'Lost') THEN COALESCE(Dollars, 0) ELSE 0 END),
+    {agg}(CASE WHEN Outcome = 'Pending' THEN COALESCE(Wager, 0) ELSE 0 END),
+    {agg}(CASE WHEN Outcome = 'Pending' THEN COALESCE(Dollars, 0) ELSE 0 END)
+FROM bets
+'''
+
+_INSERT_COLUMNS = 'season, week, expert, bet_type, ' + ', '.join(ROLLUP_COLUMNS)
+
+_UPSERT_SQL = (
+    f'INSERT INTO bet_rollups ({_INSERT_COLUMNS})\n'
+    + _ROLLUP_SELECT.format(agg='{sign} * SUM')
+    + 'WHERE id IN ({ids})\n'
+    + 'GROUP BY 1, 2, 3, 4\n'
+    + 'ON CONFLICT (season, week, expert, bet_type) DO UPDATE SET\n'
+    + ',\n'.join(f'    {col} = bet_rollups.{col} + excluded.{col}' for col in ROLLUP_COLUMNS)
+)
+
+_REBUILD_SQL = (
+    f'INSERT INTO bet_rollups ({_INSERT_COLUMNS})\n'
+    + _ROLLUP_SELECT.format(agg='SUM')
+    + 'GROUP BY 1, 2, 3, 4'
+)
+
+# Settled profit/loss per expert and day, kept in step with the bets table
+# the same way as bet_rollups. A settlement adds to its day's row, so the
+# bankroll curves (bankroll.py) are a running sum over this small table.
+LEDGER_DDL = '''
+CREATE TABLE IF NOT EXISTS bankroll_ledger (
+    season INTEGER NOT NULL,
+    expert TEXT NOT NULL,
+    day TEXT NOT NULL,
+    week INTEGER NOT NULL,
+    settled INTEGER NOT NULL DEFAULT 0,
+    dollars REAL NOT NULL DEFAULT 0,
+    PRIMARY KEY (season, expert, day, week)
+)
+'''
+
+LEDGER_COLUMNS = ['settled', 'dollars']
+
+# Days are stored as ISO text, so Postgres dates are cast to match SQLite
+_LEDGER_SELECT = '''
+SELECT
+    COALESCE(season, 0),
+    COALESCE(Expert, ''),
+    CAST(Date AS TEXT),
+    COALESCE(Week, 0),
+    {agg}(1),
+    {agg}(COALESCE(Dollars, 0))
+FROM bets
+WHERE Outcome IN ('Won', 'Lost', 'Push') AND Date IS NOT NULL
+'''
+
+_LEDGER_UPSERT_SQL = (
+    'INSERT INTO bankroll_ledger (season, expert, day, week, settled, dollars)\n'
+    + _LEDGER_SELECT.format(agg='{sign} * SUM')
+    + 'AND id IN ({ids})\n'
+    + 'GROUP BY 1, 2, 3, 4\n'
+    + 'ON CONFLICT (season, expert, day, week) DO UPDATE SET\n'
+    + ',\n'.join(f'    {col} = bankroll_ledger.{col} + excluded.{col}' for col in LEDGER_COLUMNS)
+)
+
+_LEDGER_REBUILD_SQL = (
+    'INSERT INTO bankroll_ledger (season, expert, day, week, settled, dollars)\n'
+    + _LEDGER_SELECT.format(agg='SUM')
+    + 'GROUP BY 1, 2, 3, 4'
+)
+
+
+def _ledger_from_snapshots(db, conn):
+    """Add closed seasons' settled bets to bankroll_ledger from their snapshot files."""
+    # Imported here: season_archive builds on bets_data, which builds on this module
+    from season_archive import load_snapshot
+
+    c = conn.cursor()
+    c.execute('SELECT path FROM closed_seasons')
+    for (path,) in c.fetchall():
+        season_bets = load_snapshot(path)
+        season_bets = season_bets[season_bets['Outcome'].isin(['Won', 'Lost', 'Push']) & season_bets['Date'].notna()]
+        days = season_bets.assign(Expert=season_bets['Expert'].astype(object).fillna(''),
+                                  Week=season_bets['Week'].fillna(0), Date=season_bets['Date'].dt.strftime('%Y-%m-%d'))
+        days = days.groupby(['season', 'Expert', 'Date', 'Week'], observed=True)['Dollars'].agg(['size', 'sum']).reset_index()
+        c.executemany(db.sql('INSERT INTO bankroll_ledger (season, expert, day, week, settled, dollars) VALUES (?, ?, ?, ?, ?, ?)'),
+                      [(int(season), expert, day, int(week), int(settled), round(float(dollars), 2))
+                       for season, expert, day, week, settled, dollars in days.itertuples(index=False)])
+
+
+def ensure_rollups_table(db, conn):
+    """Create bet_rollups and bankroll_ledger if missing, backfilling each when it's empty but bets aren't."""
+    c = conn.cursor()
+    c.execute(ROLLUPS_DDL)
+    c.execute('SELECT COUNT(*) FROM bet_rollups')
+    if c.fetchone()[0] == 0:
+        c.execute(_REBUILD_SQL)
+    c.execute(LEDGER_DDL)
+    c.execute('SELECT COUNT(*) FROM bankroll_ledger')
+    if c.fetchone()[0] == 0:
+        c.execute(_LEDGER_REBUILD_SQL)
+        _ledger_from_snapshots(db, conn)
+
+
+def apply_bets(db, conn, bet_ids, sign):
+    """Add (sign=1) or remove (sign=-1) bets' current rows from the rollups and the
+    bankroll ledger, APPLY_BATCH_SIZE bets per statement."""
+    bet_ids = [int(bet_id) for bet_id in bet_ids]
+    c = conn.cursor()
+    for start in range(0, len(bet_ids), APPLY_BATCH_SIZE):
+        batch = bet_ids[start:start + APPLY_BATCH_SIZE]
+        ids = ', '.join('?' * len(batch))
+        c.execute(db.sql(_UPSERT_SQL.format(sign=int(sign), ids=ids)), batch)
+        c.execute(db.sql(_LEDGER_UPSERT_SQL.format(sign=int(sign), ids=ids)), batch)
+
+
+def rebuild_rollups(db):
+    """Recompute bet_rollups and bankroll_ledger from the raw bets table (closed seasons are left as they are)."""
+    with db.connection() as conn:
+        c = conn.cursor()
+        c.execute(ROLLUPS_DDL)
+        c.execute(LEDGER_DDL)
+        # Closed seasons' bets are only in their snapshot files, so their rollups are kept
+        c.execute('DELETE FROM bet_rollups WHERE season NOT IN (SELECT season FROM closed_seasons)')
+        c.execute('DELETE FROM bankroll_ledger WHERE season NOT IN (SELECT season FROM closed_seasons)')
+        c.execute(_REBUILD_SQL)
+        c.execute(_LEDGER_REBUILD_SQL)
+        c.execute('SELECT COUNT(*) FROM bet_rollups')
+        return c.fetchone()[0]
+
+
+if __name__ == '__main__':
+    from bets_data import bump_version, prepare
+    from db import get_database
+
+    parser = argparse.ArgumentParser(description="Rebuild the bet_rollups and bankroll_ledger tables from the bets table.")
+    parser.add_argument('database_url', nargs='?', default=os.getenv('DATABASE_URL', 'test_db.sqlite'))
+    args = parser.parse_args()
+
+    db = get_database(args.database_url)
+    prepare(db)
+    rows = rebuild_rollups(db)
+    # Drop any cached aggregates built from the old rollups
+    with db.connection() as conn:
+        bump_version(db, conn)
+    print(f"Rebuilt bet_rollups: {rows} rows.")
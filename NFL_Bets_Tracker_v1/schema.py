@@ -0,0 +1,197 @@
+from seasons import SEASON_SQL
+
+# Columns of a bet, in the order add_bet() expects them
+BET_COLUMNS = ['Date', 'Week', 'Expert', 'Team_Player', 'Pick', 'Type', 'Side', 'Wager', 'Odds', 'Outcome', 'Dollars']
+
+# Every stored column, in table order
+STORED_COLUMNS = ['id'] + BET_COLUMNS + ['season', 'revision', 'source_id']
+
+# The bets table. Dates are ISO (YYYY-MM-DD) so they sort and index
+# correctly, and season is stored so per-season queries can use an index.
+# revision is the bets table version (see bets_data.py) of the write that
+# last touched the row, so cached frames can fetch just the rows changed
+# since they were read. source_id is the sheet's ID for imported bets
+# (csv_upload_initial.py matches re-imported rows on it); id is always the
+# database's own, so bets entered in the app never take a sheet's ID.
+# It is partitioned by season (see partitions.py): on SQLite this is each
+# season's table, on Postgres the partitioned parent, which can't have a
+# primary key without season in it.
+BETS_DDL = {
+    'sqlite': '''
+CREATE TABLE IF NOT EXISTS {table} (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    Date TEXT,
+    Week INTEGER,
+    Expert TEXT,
+    Team_Player TEXT,
+    Pick TEXT,
+    Type TEXT,
+    Side TEXT,
+    Wager REAL,
+    Odds INTEGER,
+    Outcome TEXT,
+    Dollars REAL,
+    season INTEGER,
+    revision INTEGER DEFAULT 0,
+    source_id INTEGER
+)
+''',
+    'postgres': '''
+CREATE TABLE IF NOT EXISTS {table} (
+    id SERIAL NOT NULL,
+    Date DATE,
+    Week INTEGER,
+    Expert TEXT,
+    Team_Player TEXT,
+    Pick TEXT,
+    Type TEXT,
+    Side TEXT,
+    Wager NUMERIC,
+    Odds NUMERIC,
+    Outcome TEXT,
+    Dollars NUMERIC,
+    season INTEGER,
+    revision INTEGER DEFAULT 0,
+    source_id BIGINT
+) PARTITION BY LIST (season)
+''',
+}
+
+# Indexes on each season's table (SQLite) or the partitioned table (Postgres)
+INDEXES = {
+    'idx_bets_outcome': 'Outcome',
+    'idx_bets_season_expert': 'season, Expert',
+    'idx_bets_date_id': 'Date, id',
+    'idx_bets_revision': 'revision',
+}
+
+# Looks up a bet by id in every Postgres partition (SQLite's id is the rowid)
+PG_ID_INDEX_DDL = 'CREATE UNIQUE INDEX IF NOT EXISTS idx_bets_id ON bets (id, season)'
+
+# A sheet ID is unique per season on Postgres (a partitioned table's unique
+# index needs season in it); an import replaces a row wherever it is, so it
+# never ends up in two seasons. On SQLite see source_id_index_ddl().
+PG_SOURCE_ID_INDEX_DDL = 'CREATE UNIQUE INDEX IF NOT EXISTS idx_bets_source_id ON bets (source_id, season)'
+
+# Seasons frozen into snapshot files by season_archive.py; their bets are no
+# longer in the bets table, but their rollups are kept
+CLOSED_SEASONS_DDL = '''
+CREATE TABLE IF NOT EXISTS closed_seasons (
+    season INTEGER PRIMARY KEY,
+    rows INTEGER NOT NULL,
+    path TEXT NOT NULL
+)
+'''
+
+# Indexes replaced by the ones above
+DROPPED_INDEXES = ['idx_bets_date']
+
+# Column names used by the original Postgres page, renamed to the shared layout
+LEGACY_COLUMNS = {
+    'pick_type': 'Team_Player',
+    'pick_answer': 'Pick',
+    'bet_type': 'Type',
+    'bet_side': 'Side',
+}
+
+# Columns older tables may be missing entirely, with their SQLite/Postgres types
+ADDED_COLUMNS = {
+    'Side': ('TEXT', 'TEXT'),
+    'Wager': ('REAL', 'NUMERIC'),
+    'Dollars': ('REAL', 'NUMERIC'),
+    'season': ('INTEGER', 'INTEGER'),
+    'revision': ('INTEGER DEFAULT 0', 'INTEGER DEFAULT 0'),
+    'source_id': ('INTEGER', 'BIGINT'),
+}
+
+# Rewrites MM/DD/YYYY dates (the sheet's format) as YYYY-MM-DD
+ISO_DATE_UPDATE_SQL = '''
+UPDATE {table}
+SET Date = SUBSTR(Date, 7, 4) || '-' || SUBSTR(Date, 1, 2) || '-' || SUBSTR(Date, 4, 2)
+WHERE Date LIKE '__/__/____'
+'''
+
+SEASON_BACKFILL_SQL = f'UPDATE {{table}} SET season = {SEASON_SQL} WHERE season IS NULL AND Date IS NOT NULL'
+
+
+def index_ddl(table='bets'):
+    """CREATE INDEX statements for the bets table, or a SQLite season's table (idx_bets_2024_outcome, ...)."""
+    return [f"CREATE INDEX IF NOT EXISTS {name.replace('idx_bets', f'idx_{table}', 1)} ON {table} ({columns})"
+            for name, columns in INDEXES.items()]
+
+
+def source_id_index_ddl(table):
+    """CREATE UNIQUE INDEX statement for the sheet IDs in a SQLite season's table."""
+    return f'CREATE UNIQUE INDEX IF NOT EXISTS idx_{table}_source_id ON {table} (source_id)'
+
+
+def _columns(db, conn, table):
+    """Return {lower-case column name: data type} for a bets table ('bets', or 'main.bets_<season>' on SQLite)."""
+    c = conn.cursor()
+    if db.backend == 'postgres':
+        c.execute('SELECT column_name, data_type FROM information_schema.columns WHERE table_name = %s', (table,))
+        return {name.lower(): data_type.lower() for name, data_type in c.fetchall()}
+    schema, name = table.split('.')
+    c.execute(f'PRAGMA {schema}.table_info({name})')
+    return {row[1].lower(): row[2].lower() for row in c.fetchall()}
+
+
+def migrate_bets_table(db, conn, table):
+    """Bring one bets table up to date: rename legacy columns, add missing ones,
+    rewrite sheet-style dates as ISO and fill in season. Returns how many rows were rewritten."""
+    c = conn.cursor()
+    columns = _columns(db, conn, table)
+    for old, new in LEGACY_COLUMNS.items():
+        if old in columns and new.lower() not in columns:
+            c.execute(f'ALTER TABLE {table} RENAME COLUMN {old} TO {new}')
+    columns = _columns(db, conn, table)
+    type_index = 1 if db.backend == 'postgres' else 0
+    for name, types in ADDED_COLUMNS.items():
+        if name.lower() not in columns:
+            c.execute(f'ALTER TABLE {table} ADD COLUMN {name} {types[type_index]}')
+
+    changed = 0
+    if 'source_id' not in columns:
+        # Imports used to store the sheet's ID as the bet's id
+        c.execute(f'UPDATE {table} SET source_id = id')
+        changed += c.rowcount
+    if db.backend == 'postgres':
+        if columns.get('date', 'date') != 'date':
+            c.execute(ISO_DATE_UPDATE_SQL.format(table=table))
+            changed += c.rowcount
+            c.execute(f'ALTER TABLE {table} ALTER COLUMN Date TYPE DATE USING NULLIF(Date, \'\')::date')
+    else:
+        c.execute(ISO_DATE_UPDATE_SQL.format(table=table))
+        changed += c.rowcount
+    c.execute(SEASON_BACKFILL_SQL.format(table=table))
+    changed += c.rowcount
+    return changed
+
+
+def has_unpartitioned_bets(db, conn):
+    """True if the bets table predates season partitioning (a plain table)."""
+    c = conn.cursor()
+    if db.backend == 'postgres':
+        c.execute("SELECT relkind FROM pg_class WHERE oid = to_regclass('bets')")
+        row = c.fetchone()
+        return row is not None and row[0] != 'p'
+    c.execute("SELECT 1 FROM main.sqlite_master WHERE type = 'table' AND name = 'bets'")
+    return c.fetchone() is not None
+
+
+def ensure_schema(db, conn):
+    """Create the bets table, or bring an older one up to date.
+
+    Safe to run repeatedly. Creates the partitioned table on Postgres (on
+    SQLite each season's table is made by partitions.py) and migrates a
+    table from before partitioning so partitions.py can split it up.
+    Returns how many rows were rewritten.
+    """
+    c = conn.cursor()
+    c.execute(CLOSED_SEASONS_DDL)
+    if db.backend == 'postgres':
+        c.execute(BETS_DDL['postgres'].format(table='bets'))
+        return migrate_bets_table(db, conn, 'bets')
+    if has_unpartitioned_bets(db, conn):
+        return migrate_bets_table(db, conn, 'main.bets')
+    return 0
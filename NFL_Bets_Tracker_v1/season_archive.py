@@ -0,0 +1,136 @@
+import argparse
+import os
+import threading
+import pandas as pd
+import pyarrow as pa
+from bets_data import bump_version, closed_seasons, compact_bets, prepare, read_bets
+from db import get_database
+from partitions import drop_partition
+from seasons import current_season
+
+# Finished seasons never change, so closing one writes its bets to an Arrow
+# IPC file and drops the season's partition. Dashboards memory-map the
+# file instead of re-reading the season from SQL. Rollups for a closed
+# season stay in bet_rollups, so the summaries are unaffected.
+
+ARCHIVE_DIR = os.getenv('BETS_ARCHIVE_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'archive'))
+
+# 'uncompressed' lets the loader use the mapped buffers as they are; 'lz4'
+# or 'zstd' shrink the files, but are decompressed into memory on every load
+SNAPSHOT_COMPRESSION = os.getenv('BETS_SNAPSHOT_COMPRESSION', 'uncompressed')
+
+SNAPSHOT_SCHEMA = pa.schema([
+    ('id', pa.int64()),
+    ('Date', pa.date32()),
+    ('Week', pa.int32()),
+    ('Expert', pa.string()),
+    ('Team_Player', pa.string()),
+    ('Pick', pa.string()),
+    ('Type', pa.string()),
+    ('Side', pa.string()),
+    ('Wager', pa.float64()),
+    ('Odds', pa.float64()),
+    ('Outcome', pa.string()),
+    ('Dollars', pa.float64()),
+    ('season', pa.int32()),
+])
+
+# Loaded snapshots, keyed by path and holding (modified time, frame)
+_snapshots = {}
+_snapshots_lock = threading.Lock()
+
+
+def snapshot_path(season, archive_dir=ARCHIVE_DIR):
+    return os.path.join(archive_dir, f'bets_{int(season)}.arrow')
+
+
+def _to_table(bets_df):
+    bets_df = bets_df.copy()
+    bets_df['Date'] = pd.to_datetime(bets_df['Date']).dt.date
+    for col in ['Wager', 'Odds', 'Dollars']:
+        bets_df[col] = pd.to_numeric(bets_df[col], errors='coerce')
+    return pa.Table.from_pandas(bets_df[SNAPSHOT_SCHEMA.names], schema=SNAPSHOT_SCHEMA, preserve_index=False)
+
+
+def close_season(db, season, archive_dir=ARCHIVE_DIR):
+    """Freeze a finished season into its snapshot file and drop its partition.
+
+    Refuses the current season and seasons with pending bets. The file is
+    written and read back before the partition is dropped, and the drop, the
+    closed_seasons record and the version bump commit together. Returns the
+    number of bets archived.
+    """
+    season = int(season)
+    if season >= current_season():
+        raise ValueError(f"The {season} season isn't finished yet.")
+    prepare(db)
+    with db.connection() as conn:
+        if season in closed_seasons(conn):
+            raise ValueError(f"The {season} season is already closed.")
+        bets_df = read_bets(db, conn, 'WHERE season = ? ORDER BY Date, id', (season,))
+    pending = int((bets_df['Outcome'] == 'Pending').sum())
+    if pending:
+        raise ValueError(f"The {season} season still has {pending} pending bets.")
+
+    path = snapshot_path(season, archive_dir)
+    os.makedirs(archive_dir, exist_ok=True)
+    table = _to_table(bets_df)
+    options = pa.ipc.IpcWriteOptions(compression=None if SNAPSHOT_COMPRESSION == 'uncompressed' else SNAPSHOT_COMPRESSION)
+    with pa.OSFile(path + '.tmp', 'wb') as sink:
+        with pa.ipc.new_file(sink, table.schema, options=options) as writer:
+            writer.write_table(table)
+    os.replace(path + '.tmp', path)
+    if read_snapshot(path).num_rows != len(bets_df):
+        raise ValueError(f"The snapshot written to {path} doesn't match the {season} season.")
+
+    with db.connection() as conn:
+        c = conn.cursor()
+        c.execute(db.sql('SELECT COUNT(*) FROM bets WHERE season = ?'), (season,))
+        if c.fetchone()[0] != len(bets_df):
+            raise ValueError(f"The {season} season changed while it was being archived; try again.")
+        c.execute(db.sql('INSERT INTO closed_seasons (season, rows, path) VALUES (?, ?, ?)'), (season, len(bets_df), path))
+        drop_partition(db, conn, season)
+        bump_version(db, conn, reset=True)
+    return len(bets_df)
+
+
+def read_snapshot(path):
+    """Memory-map a snapshot file as an Arrow table."""
+    # The table's buffers point into the mapping, which stays open while they're in use
+    return pa.ipc.open_file(pa.memory_map(path, 'r')).read_all()
+
+
+def load_snapshot(path):
+    """A snapshot as a compact frame, loaded once per process (and again only if the file changes)."""
+    modified = os.path.getmtime(path)
+    with _snapshots_lock:
+        hit = _snapshots.get(path)
+    if hit is not None and hit[0] == modified:
+        return hit[1]
+    bets_df = compact_bets(read_snapshot(path).to_pandas(date_as_object=True))
+    with _snapshots_lock:
+        _snapshots[path] = (modified, bets_df)
+    return bets_df
+
+
+def closed_season_path(db, conn, season):
+    """The snapshot file of a closed season, or None if the season is still in the bets table."""
+    c = conn.cursor()
+    c.execute(db.sql('SELECT path FROM closed_seasons WHERE season = ?'), (int(season),))
+    row = c.fetchone()
+    return row[0] if row else None
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Archive a finished season to an Arrow snapshot and remove it from the bets table.")
+    parser.add_argument('season', type=int)
+    parser.add_argument('--database-url', default=os.getenv('DATABASE_URL', 'test_db.sqlite'))
+    parser.add_argument('--archive-dir', default=ARCHIVE_DIR)
+    args = parser.parse_args()
+
+    try:
+        rows = close_season(get_database(args.database_url), args.season, args.archive_dir)
+    except (ValueError, OSError) as e:
+        print(f"Could not close the {args.season} season: {e}")
+    else:
+        print(f"Closed the {args.season} season: {rows} bets written to {snapshot_path(args.season, args.archive_dir)}.")
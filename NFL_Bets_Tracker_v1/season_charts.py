@@ -0,0 +1,100 @@
+import pandas as pd
+from bets_data import cached
+from summary_queries import read_season_chart_data
+
+# The page2 charts, built once per season and bets table version and kept
+# as Plotly JSON, so a repeat visit only decodes them instead of recomputing
+# the data and rebuilding the figures. Plotly is imported when a figure is
+# first built or decoded, so importing this module doesn't load it.
+
+
+def _bet_type_fig(chart_data):
+    import plotly.express as px
+    return px.bar(
+        chart_data['bet_type_counts'].reset_index(),
+        x='Type',
+        y='count',
+        labels={'count': 'Count', 'Type': 'Bet Type'},
+        title='Most Common Bet Types',
+        color_discrete_sequence=['#228B22']
+    )
+
+
+def _dollars_per_type_fig(chart_data):
+    import plotly.express as px
+    dollars_per_type = chart_data['dollars_per_type'].reset_index()
+    dollars_per_type.columns = ['Type', 'Total Dollars']
+    dollars_per_type['Color'] = 0 > dollars_per_type['Total Dollars']
+    fig = px.bar(
+        dollars_per_type,
+        x='Type',
+        y='Total Dollars',
+        color='Color',
+        color_discrete_map={False: '#4682B4', True: 'lightcoral'},
+        labels={'Type': 'Bet Type', 'Total Dollars': 'Total Dollars'},
+        title='Settled Dollars per Bet Type'
+    )
+    fig.update_layout(showlegend=False)
+    return fig
+
+
+def _bet_pick_fig(chart_data):
+    import plotly.express as px
+    common_picks = chart_data['bet_pick_counts'].reset_index()
+    common_picks.columns = ['Pick', 'Count']
+    return px.bar(
+        common_picks,
+        x='Pick',
+        y='Count',
+        labels={'Pick': 'Bet Pick', 'Count': 'Count'},
+        title='Most Common Bet Picks',
+        color_discrete_sequence=['#F4A460']
+    )
+
+
+def _dollars_per_pick_fig(chart_data):
+    import plotly.express as px
+    top_picks = chart_data['top_picks']
+    bottom_picks = chart_data['bottom_picks']
+    top_bottom_picks = pd.concat([top_picks, bottom_picks]).reset_index()
+    top_bottom_picks.columns = ['Pick', 'Total Dollars']
+    top_bottom_picks['Color'] = ['Top 5'] * len(top_picks) + ['Bottom 5'] * len(bottom_picks)
+    return px.bar(
+        top_bottom_picks,
+        x='Pick',
+        y='Total Dollars',
+        color='Color',
+        color_discrete_map={'Top 5': 'skyblue', 'Bottom 5': 'lightcoral'},
+        labels={'Pick': 'Bet Pick', 'Total Dollars': 'Total Dollars'},
+        title='Settled Dollars per Pick (Top 5 and Bottom 5)'
+    )
+
+
+# (name, subheader, figure builder) in page order
+CHARTS = [
+    ('bet_type_fig', "Most Common Bet Types(Last Year)", _bet_type_fig),
+    ('dollars_per_type_fig', "Sum of Dollars Type (Last Year) - Top 5 and Bottom 5", _dollars_per_type_fig),
+    ('bet_pick_fig', "Most Common Bet Picks (Last Year)", _bet_pick_fig),
+    ('dollars_per_pick_fig', "Sum of Dollars Pick (Last Year) - Top 5 and Bottom 5", _dollars_per_pick_fig),
+]
+
+
+def _build_charts(db, conn, season):
+    chart_data = read_season_chart_data(db, conn, season)
+    if chart_data is None:
+        return None
+    return [(name, subheader, build(chart_data).to_json()) for name, subheader, build in CHARTS]
+
+
+def season_charts(db, season):
+    """page2's charts for one season as (name, subheader, figure JSON), or None if it has no bets.
+
+    Cached until the bets table changes; decode a figure with figure().
+    """
+    return cached(db, 'season_charts', lambda conn: _build_charts(db, conn, season), args=season)
+
+
+def figure(figure_json):
+    """Turn cached figure JSON back into a Plotly figure."""
+    import plotly.io as pio
+    return pio.from_json(figure_json, skip_invalid=True)
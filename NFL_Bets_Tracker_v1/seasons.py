@@ -0,0 +1,32 @@
+import datetime
+
+# NFL seasons start in August; bets before August belong to the previous season.
+SEASON_START_MONTH = 8
+
+# Season of a bet, derived from its ISO (YYYY-MM-DD) Date
+SEASON_SQL = f'''
+CAST(SUBSTR(CAST(Date AS TEXT), 1, 4) AS INTEGER)
+- CASE WHEN CAST(SUBSTR(CAST(Date AS TEXT), 6, 2) AS INTEGER) < {SEASON_START_MONTH} THEN 1 ELSE 0 END
+'''
+
+
+def to_date(value):
+    """Parse a bet date given as a date, an ISO string or the sheet's MM/DD/YYYY."""
+    if isinstance(value, datetime.datetime):
+        return value.date()
+    if isinstance(value, datetime.date):
+        return value
+    value = str(value).strip()
+    if '/' in value:
+        return datetime.datetime.strptime(value, '%m/%d/%Y').date()
+    return datetime.date.fromisoformat(value[:10])
+
+
+def season_for(date):
+    """Return the season (starting year) a date falls in."""
+    return date.year if date.month >= SEASON_START_MONTH else date.year - 1
+
+
+def current_season(today=None):
+    """Return the season that today's date falls in."""
+    return season_for(today or datetime.date.today())
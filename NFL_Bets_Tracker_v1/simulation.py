@@ -0,0 +1,213 @@
+import multiprocessing
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+from payouts import implied_probability
+from risk import pending_book
+
+# Monte Carlo runs of the open slate: every pending bet is settled at random
+# SIM_TRIALS times, giving the spread of profit/loss for the group and each
+# expert instead of the single "Possible Profit Gained" number.
+#
+# A bet's chance comes from its Odds, with the usual -110/-110 margin taken
+# out (so -110 is a coin flip), optionally scaled by how often the expert has
+# beaten their own odds over every season. Bets in the same market (see
+# risk.py) share one draw per trial, so an Over and an Under on the same line
+# never both win and two Overs at different lines move together. Bets settle
+# day by day, and ruin is the running loss reaching the bankroll at the end
+# of any day.
+#
+# Trials are split into chunks, each drawn in one go with NumPy and spread
+# over a process pool that stays up between runs, so starting its workers
+# is only paid once. Inside the Streamlit app the chunks are drawn in this
+# process instead: Streamlit installs the page it runs as __main__, and a
+# new worker process imports __main__ before it does any work, so every
+# worker would run the page again.
+
+# Trials per run
+SIM_TRIALS = int(os.getenv('SIM_TRIALS', '100000'))
+
+# Processes drawing trials outside Streamlit (1 draws them in this process)
+SIM_WORKERS = int(os.getenv('SIM_WORKERS', str(os.cpu_count() or 1)))
+
+# Bankroll each expert starts the slate with, for the risk of ruin
+SIM_BANKROLL = float(os.getenv('SIM_BANKROLL', '500'))
+
+# Most bets x trials drawn at once, which bounds each chunk's memory
+CHUNK_CELLS = 4_000_000
+
+# Margin of a -110/-110 market, taken out of every implied probability
+OVERROUND = 2 * float(implied_probability(-110)) - 1
+
+# Settled bets' worth of weight the odds get against an expert's record
+PRIOR_BETS = 50
+
+PERCENTILES = [5, 25, 50, 75, 95]
+
+_pool = None
+_pool_workers = 0
+_pool_lock = threading.Lock()
+
+
+def win_probability(odds, edge=1.0):
+    """Chance each bet wins: its odds' implied probability without the margin, times the expert's edge."""
+    fair = implied_probability(odds) / (1 + OVERROUND)
+    return np.clip(fair * edge, 0.01, 0.99)
+
+
+def expert_edges(summary_df):
+    """How much more often each expert wins than their odds say, from expert_season_summary().
+
+    The rollups behind it cover every season, closed ones included, and
+    keep the stakes and dollars of won and lost bets. Whatever the odds, a
+    bet is expected to return its stake over 1 plus the margin, so the edge
+    is what the expert's bets returned (stakes plus profit/loss) over that,
+    shrunk towards 1 by PRIOR_BETS bets at their average stake so a short
+    record doesn't swing it far. Pushes don't count.
+    """
+    record = summary_df.groupby('Expert')[['won_bets', 'lost_bets', 'wagered', 'dollars']].sum()
+    record = record[record['wagered'] > 0]
+    if record.empty:
+        return pd.Series(dtype=float)
+    expected = record['wagered'] / (1 + OVERROUND)
+    prior = PRIOR_BETS * expected / (record['won_bets'] + record['lost_bets']).clip(lower=1)
+    return ((record['wagered'] + record['dollars'] + prior) / (expected + prior)).rename('edge')
+
+
+def _simulate_chunk(trials, seed, market, markets, sign, limit, payouts, starts, buckets, stakes, experts, days):
+    """Draw `trials` runs of the slate.
+
+    Bets come sorted by expert and day: buckets are the (expert, day) cells
+    that have bets, starts where each one's bets begin, payouts each bet's
+    stake plus winnings and stakes every cell's total wagers. Returns each
+    expert's final profit/loss and lowest end-of-day running profit/loss,
+    (trials x experts) each, and the group's lowest.
+    """
+    rng = np.random.default_rng(seed)
+    # Laid out bets x trials so each bet's trials are contiguous. One draw per
+    # market; a low draw is a high number (yards, margin), so an Over wins
+    # below its chance and an Under above one minus its chance
+    draws = rng.random((markets, trials), dtype=np.float32)[market]
+    returned = np.where(draws * sign[:, None] < limit[:, None], payouts[:, None], np.float32(0))
+    daily = np.zeros((experts * days, trials), dtype=np.float32)
+    daily[buckets] = np.add.reduceat(returned, starts, axis=0)
+    daily = (daily - stakes[:, None]).reshape(experts, days, trials)
+    running = np.cumsum(daily, axis=1)
+    group_running = np.cumsum(daily.sum(axis=0), axis=0)
+    return running[:, -1].T, np.minimum(running.min(axis=1), 0).T, np.minimum(group_running.min(axis=0), 0)
+
+
+def _in_streamlit():
+    # Only ask Streamlit if a page already imported it
+    if 'streamlit' not in sys.modules:
+        return False
+    from streamlit import runtime
+    return runtime.exists()
+
+
+def _get_pool(workers):
+    global _pool, _pool_workers
+    with _pool_lock:
+        if _pool is None or _pool_workers != workers:
+            if _pool is not None:
+                _pool.shutdown(wait=False)
+            # Not forked from this (possibly threaded) process, which can copy a
+            # lock another thread holds into the workers; a forkserver with this
+            # module preloaded starts them quickly where there is one
+            if 'forkserver' in multiprocessing.get_all_start_methods():
+                context = multiprocessing.get_context('forkserver')
+                context.set_forkserver_preload([__name__])
+            else:
+                context = multiprocessing.get_context('spawn')
+            _pool = ProcessPoolExecutor(max_workers=workers, mp_context=context)
+            _pool_workers = workers
+        return _pool
+
+
+def _outcomes(final, low, bankroll):
+    """Percentiles, mean and the chance of a losing slate and of ruin, over trials."""
+    stats = {f'P{p}': v for p, v in zip(PERCENTILES, np.percentile(final, PERCENTILES, axis=0))}
+    stats['Mean'] = final.mean(axis=0)
+    stats['Losing %'] = (final < 0).mean(axis=0) * 100
+    stats['Ruin %'] = (low <= -bankroll).mean(axis=0) * 100
+    return stats
+
+
+def simulate_slate(pending_df, edges=None, bankroll=SIM_BANKROLL, trials=SIM_TRIALS, workers=SIM_WORKERS, seed=None):
+    """Settle the pending bets at random `trials` times, or return None if there are none.
+
+    edges (from expert_edges()) scales each expert's chances; None uses the
+    odds alone. bankroll is each expert's; the group's is bankroll times the
+    experts with pending bets. Returns a dict: 'group' (percentiles, mean,
+    losing and ruin chances), 'by_expert' (the same per expert), 'outcomes'
+    (the group's profit/loss in every trial), 'trials' and 'seconds'.
+    """
+    if pending_df.empty:
+        return None
+    started = time.perf_counter()
+    wagers, to_win, market, sign, _ = pending_book(pending_df)
+    expert, experts = pd.factorize(pending_df['Expert'].fillna(''))
+    expert_edge = np.ones(len(experts)) if edges is None else pd.Series(experts).map(edges).fillna(1.0).to_numpy(dtype=float)
+    prob = win_probability(pd.to_numeric(pending_df['Odds'], errors='coerce').fillna(0).to_numpy(dtype=float), expert_edge[expert])
+    # Bets settle day by day; undated ones on the last day
+    day, dates = pd.factorize(pd.to_datetime(pending_df['Date'], errors='coerce'), sort=True)
+    days = max(len(dates), 1)
+    day = np.where(day < 0, days - 1, day)
+    bucket = expert * days + day
+    order = np.argsort(bucket, kind='stable')
+    buckets, starts = np.unique(bucket[order], return_index=True)
+    stakes = np.bincount(bucket, weights=wagers, minlength=len(experts) * days).astype(np.float32)
+    args = (market[order], int(market.max()) + 1, sign[order].astype(np.float32), (prob - (sign < 0))[order].astype(np.float32),
+            (to_win + wagers)[order].astype(np.float32), starts, buckets, stakes, len(experts), days)
+
+    # Enough chunks to keep every worker busy, none bigger than CHUNK_CELLS
+    chunk = max(1, min(CHUNK_CELLS // len(pending_df), -(-trials // max(workers, 1))))
+    sizes = [min(chunk, trials - start) for start in range(0, trials, chunk)]
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    if workers <= 1 or _in_streamlit():
+        chunks = [_simulate_chunk(size, s, *args) for size, s in zip(sizes, seeds)]
+    else:
+        pool = _get_pool(workers)
+        chunks = [future.result() for future in [pool.submit(_simulate_chunk, size, s, *args) for size, s in zip(sizes, seeds)]]
+    final = np.concatenate([c[0] for c in chunks]).astype(float)
+    low = np.concatenate([c[1] for c in chunks]).astype(float)
+    group_low = np.concatenate([c[2] for c in chunks]).astype(float)
+    outcomes = final.sum(axis=1)
+
+    group = {name: float(value) for name, value in _outcomes(outcomes, group_low, bankroll * len(experts)).items()}
+    by_expert = pd.DataFrame(_outcomes(final, low, bankroll), index=pd.Index(experts, name='Expert'))
+    by_expert.insert(0, 'Edge', expert_edge)
+    return {
+        'group': group,
+        'by_expert': by_expert.round(2).sort_values('P50', ascending=False),
+        'outcomes': outcomes,
+        'trials': trials,
+        'seconds': time.perf_counter() - started,
+    }
+
+
+def simulation_figure(simulation, bins=60):
+    """Histogram of the group's simulated profit/loss, losing trials in red."""
+    # Imported here so running a simulation doesn't load Plotly
+    import plotly.express as px
+
+    counts, edges = np.histogram(simulation['outcomes'], bins=bins)
+    histogram = pd.DataFrame({
+        'Profit/Loss': (edges[:-1] + edges[1:]) / 2,
+        'Trials %': counts / counts.sum() * 100,
+        'Losing': (edges[:-1] + edges[1:]) / 2 < 0,
+    })
+    fig = px.bar(
+        histogram,
+        x='Profit/Loss',
+        y='Trials %',
+        color='Losing',
+        color_discrete_map={False: '#4682B4', True: 'lightcoral'},
+        title=f"Simulated Slate Profit/Loss ({simulation['trials']:,} trials)",
+    )
+    fig.update_layout(showlegend=False, bargap=0)
+    return fig
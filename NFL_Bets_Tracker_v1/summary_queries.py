@@ -0,0 +1,177 @@
+import pandas as pd
+from bets_data import cached
+from season_archive import closed_season_path, load_snapshot
+
+# One row per expert and season, summed from the bet_rollups table so only
+# a few hundred rollup rows are read, however long the ledger gets.
+EXPERT_SEASON_SQL = '''
+SELECT
+    expert AS "Expert",
+    season AS "season",
+    SUM(bets) AS "total_bets",
+    SUM(wins) AS "won_bets",
+    SUM(losses) AS "lost_bets",
+    SUM(pending) AS "pending_bets",
+    SUM(wagered) AS "wagered",
+    SUM(dollars) AS "dollars",
+    SUM(pending_wagered) AS "pending_wagered",
+    SUM(pending_dollars) AS "pending_dollars"
+FROM bet_rollups
+GROUP BY expert, season
+'''
+
+# The same totals per expert and week, for the weekly reports
+EXPERT_WEEK_SQL = '''
+SELECT
+    expert AS "Expert",
+    season AS "season",
+    week AS "Week",
+    SUM(bets) AS "total_bets",
+    SUM(wins) AS "won_bets",
+    SUM(losses) AS "lost_bets",
+    SUM(pending) AS "pending_bets",
+    SUM(wagered) AS "wagered",
+    SUM(dollars) AS "dollars",
+    SUM(pending_wagered) AS "pending_wagered",
+    SUM(pending_dollars) AS "pending_dollars"
+FROM bet_rollups
+GROUP BY expert, season, week
+'''
+
+# Bet counts and settled dollars per bet type and season, for the page2 charts
+TYPE_SEASON_SQL = '''
+SELECT
+    bet_type AS "Type",
+    season AS "season",
+    SUM(bets) AS "count",
+    SUM(dollars) AS "dollars"
+FROM bet_rollups
+GROUP BY bet_type, season
+'''
+
+# Bet counts and settled dollars per pick in one season, for the page2 charts
+# (pending bets are counted but their potential profit isn't, as in the rollups)
+PICK_TOTALS_SQL = '''
+SELECT
+    Pick AS "Pick",
+    COUNT(*) AS "count",
+    SUM(CASE WHEN Outcome <> 'Pending' THEN Dollars ELSE 0 END) AS "dollars"
+FROM bets
+WHERE season = ? AND Pick IS NOT NULL
+GROUP BY Pick
+'''
+
+# Bet counts and settled dollars per bet type in one season (closed seasons included)
+SEASON_TYPES_SQL = '''
+SELECT
+    bet_type AS "Type",
+    SUM(bets) AS "count",
+    SUM(dollars) AS "dollars"
+FROM bet_rollups
+WHERE season = ?
+GROUP BY bet_type
+ORDER BY 2 DESC
+'''
+
+# Picks shown by the page2 charts: the most common, and the best and worst by dollars
+COMMON_PICKS = 10
+TOP_PICKS = 5
+
+SUM_COLUMNS = ['total_bets', 'won_bets', 'lost_bets', 'pending_bets', 'wagered', 'dollars', 'pending_wagered', 'pending_dollars']
+
+
+def _read_expert_season(db, conn):
+    summary_df = db.read_frame(conn, EXPERT_SEASON_SQL)
+    summary_df[SUM_COLUMNS] = summary_df[SUM_COLUMNS].apply(pd.to_numeric, errors='coerce').fillna(0)
+    return summary_df
+
+
+def expert_season_summary(db):
+    """Per-expert, per-season aggregates, cached until the bets table changes."""
+    return cached(db, 'expert_season_summary', lambda conn: _read_expert_season(db, conn))
+
+
+def _read_expert_week(db, conn):
+    week_df = db.read_frame(conn, EXPERT_WEEK_SQL)
+    week_df[SUM_COLUMNS] = week_df[SUM_COLUMNS].apply(pd.to_numeric, errors='coerce').fillna(0)
+    return week_df
+
+
+def expert_week_summary(db):
+    """Per-expert, per-season, per-week aggregates, cached until the bets table changes."""
+    return cached(db, 'expert_week_summary', lambda conn: _read_expert_week(db, conn))
+
+
+def _read_type_season(db, conn):
+    type_df = db.read_frame(conn, TYPE_SEASON_SQL)
+    type_df[['count', 'dollars']] = type_df[['count', 'dollars']].apply(pd.to_numeric, errors='coerce').fillna(0)
+    return type_df
+
+
+def type_season_summary(db):
+    """Per-bet-type, per-season counts and dollars, cached until the bets table changes."""
+    return cached(db, 'type_season_summary', lambda conn: _read_type_season(db, conn))
+
+
+def season_totals(summary_df, season=None):
+    """Add up the per-expert rows for one season (or every season if None)."""
+    if season is not None:
+        summary_df = summary_df[summary_df['season'] == season]
+    totals = summary_df[SUM_COLUMNS].sum()
+    totals['win_percentage'] = (totals['won_bets'] / totals['total_bets'] * 100) if totals['total_bets'] > 0 else 0
+    totals['roi'] = (totals['dollars'] / totals['wagered'] * 100) if totals['wagered'] > 0 else 0
+    return totals
+
+
+def expert_table(summary_df, season=None):
+    """Format the per-expert standings the way the Summary pages display them."""
+    if season is not None:
+        summary_df = summary_df[summary_df['season'] == season]
+    expert_summary = summary_df.groupby('Expert')[SUM_COLUMNS].sum().rename(columns={
+        'total_bets': 'Total Bets',
+        'won_bets': 'Won Bets',
+        'lost_bets': 'Lost Bets',
+        'dollars': 'Dollars Gained',
+    })
+    win_percentage = (expert_summary['Won Bets'] / expert_summary['Total Bets'] * 100).fillna(0)
+    expert_summary['Win Percentage'] = win_percentage.map(lambda x: f"{x:.2f}%")
+    return expert_summary[['Total Bets', 'Won Bets', 'Lost Bets', 'Win Percentage', 'Dollars Gained']]
+
+
+def _pick_totals(db, conn, season):
+    """Count and settled dollars per pick in a season, from its snapshot if closed, else grouped in SQL."""
+    path = closed_season_path(db, conn, season)
+    if path is None:
+        return db.read_frame(conn, PICK_TOTALS_SQL, (int(season),))
+    season_bets = load_snapshot(path)
+    season_bets = season_bets.assign(Dollars=season_bets['Dollars'].where(season_bets['Outcome'] != 'Pending', 0))
+    grouped = season_bets.groupby('Pick', observed=True)
+    return pd.DataFrame({'count': grouped.size(), 'dollars': grouped['Dollars'].sum()}).reset_index()
+
+
+def read_season_chart_data(db, conn, season):
+    """The series behind the page2 charts for one season, or None if it has no bets.
+
+    Only the picks that are charted are picked out (nlargest/nsmallest on
+    the per-pick totals), so nothing is fully sorted.
+    """
+    picks = _pick_totals(db, conn, season)
+    if picks.empty:
+        return None
+    picks['Pick'] = picks['Pick'].astype(str)
+    picks = picks.set_index('Pick')
+    dollars_per_pick = pd.to_numeric(picks['dollars'], errors='coerce').fillna(0).astype(float).round(2)
+    season_types = db.read_frame(conn, SEASON_TYPES_SQL, (int(season),)).set_index('Type')
+    season_types = season_types.apply(pd.to_numeric, errors='coerce').fillna(0)
+    return {
+        'bet_type_counts': season_types['count'],
+        'dollars_per_type': season_types['dollars'].sort_values(ascending=False),
+        'bet_pick_counts': picks['count'].nlargest(COMMON_PICKS),
+        'top_picks': dollars_per_pick.nlargest(TOP_PICKS),
+        'bottom_picks': dollars_per_pick.nsmallest(TOP_PICKS).iloc[::-1],
+    }
+
+
+def season_chart_data(db, season):
+    """read_season_chart_data() for one season, cached until the bets table changes."""
+    return cached(db, 'season_chart_data', lambda conn: read_season_chart_data(db, conn, season), args=season)
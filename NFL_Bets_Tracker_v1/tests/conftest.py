@@ -0,0 +1,5 @@
+import os
+import sys
+
+# The modules import each other by bare name, as they do when Streamlit runs a page
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,22 @@
+import pandas as pd
+from risk import pending_risk
+
+
+def _pending(*sides):
+    return pd.DataFrame({
+        'season': 2024, 'Week': 5, 'Expert': 'Seth', 'Pick': 'Total', 'Type': 'Game Total',
+        'Side': list(sides), 'Wager': 10.0, 'Odds': -110.0, 'Outcome': 'Pending'})
+
+
+def test_half_point_hedge_cannot_push():
+    # Over and Under 244.5: one side always hits, so every outcome loses the juice
+    totals = pending_risk(_pending('Over 244.5', 'Under 244.5'))['totals']
+    assert totals['max_win'] == -0.91
+    assert totals['max_loss'] == -0.91
+
+
+def test_whole_line_hedge_can_push():
+    # Over and Under 244: landing on 244 pushes both
+    totals = pending_risk(_pending('Over 244', 'Under 244'))['totals']
+    assert totals['max_win'] == 0.0
+    assert totals['max_loss'] == -0.91
@@ -0,0 +1,107 @@
+import importlib
+import logging
+import os
+import threading
+import time
+
+# Cold start: after a restart the first visitor waits for every import the
+# page makes. The pages import only what they render, and once the first
+# page is up, a background thread imports the chart libraries and builds the
+# chart pages' cached figures, so the next page is ready when it's opened.
+# How long each step took is kept for the diagnostics view.
+
+log = logging.getLogger('warmup')
+
+# Set BETS_WARMUP=0 to skip the background warm-up
+ENABLED = os.getenv('BETS_WARMUP', '1').lower() not in ('0', 'false', 'no', 'off')
+
+# Imported by the warm-up, in order (pandas and pyarrow are already loaded by the data layer)
+WARMUP_MODULES = ['plotly.io', 'plotly.express', 'season_charts', 'bankroll']
+
+_lock = threading.Lock()
+_started = False
+_imported = False
+_times = []
+
+
+def _process_started():
+    # psutil knows when the process started; without it, count from this module's import
+    try:
+        import psutil
+    except ImportError:
+        return time.time()
+    return psutil.Process().create_time()
+
+
+PROCESS_STARTED = _process_started()
+
+
+def mark(stage, seconds=None):
+    """Record a startup stage: its duration, or with seconds=None, how long after the process started it was reached."""
+    at = time.time() - PROCESS_STARTED
+    with _lock:
+        _times.append({'stage': stage, 'seconds': at if seconds is None else seconds, 'since_start': at,
+                       'thread': threading.current_thread().name})
+
+
+def startup_times():
+    """The stages recorded so far, in order."""
+    with _lock:
+        return list(_times)
+
+
+def _timed_step(stage, step):
+    started = time.perf_counter()
+    try:
+        step()
+    except Exception:
+        log.exception("Warm-up step %s failed", stage)
+    mark(stage, time.perf_counter() - started)
+
+
+def _warm(db):
+    started = time.perf_counter()
+    for name in WARMUP_MODULES:
+        _timed_step(f'import {name}', lambda: importlib.import_module(name))
+
+    from bankroll import bankroll_curves, bankroll_figure
+    from season_charts import figure, season_charts
+    from seasons import current_season
+
+    def charts():
+        # page2's figures; decoding one also loads Plotly's validators
+        built = season_charts(db, current_season() - 1)
+        if built:
+            figure(built[0][2])
+
+    _timed_step('page2 charts', charts)
+    _timed_step('bankroll curves', lambda: bankroll_figure(bankroll_curves(db, 'day')))
+    mark('warm-up finished', time.perf_counter() - started)
+    log.info("Warm-up finished in %.2fs: %s", time.perf_counter() - started,
+             ', '.join(f"{t['stage']} {t['seconds']:.2f}s" for t in startup_times()))
+
+
+def page_imported(page):
+    """Record when the first page to run had its imports done (once per process)."""
+    global _imported
+    with _lock:
+        if _imported:
+            return
+        _imported = True
+    mark(f'{page} imports done')
+
+
+def start_warmup(db):
+    """Record the first page render and start the background warm-up, once per process.
+
+    Call it after the page has rendered.
+    """
+    global _started
+    with _lock:
+        if _started:
+            return
+        _started = True
+    mark('first page rendered')
+    if not ENABLED:
+        return
+    threading.Thread(target=_warm, args=(db,), name='warmup', daemon=True).start()
@@ -0,0 +1,142 @@
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from bets_data import prepare
+
+# Bets entered and settled from every session are written by one thread per
+# database. Writes queued while it's busy are run back to back in a single
+# transaction and committed together (one fsync for the group), so a rush of
+# entries before kickoff queues up instead of fighting over the write lock.
+# Each session waits on its own write's result, which is set only once the
+# group has committed.
+
+# Most writes committed together
+WRITE_BATCH_SIZE = int(os.getenv('WRITE_BATCH_SIZE', '100'))
+
+# How long the writer waits for more writes to join a group (ms)
+WRITE_BATCH_WAIT_MS = float(os.getenv('WRITE_BATCH_WAIT_MS', '2'))
+
+# How long a session waits for its write to be confirmed (seconds)
+WRITE_TIMEOUT = float(os.getenv('WRITE_TIMEOUT', '30'))
+
+# One writer per DATABASE_URL for the whole process
+_writers = {}
+_writers_lock = threading.Lock()
+
+
+class BetWriter:
+    """Runs write functions, called as func(db, conn, *args), on one thread with group commits."""
+
+    def __init__(self, db):
+        self.db = db
+        self._queue = queue.Queue()
+        # Groups committed and writes in them, for the diagnostics
+        self.groups = 0
+        self.writes = 0
+        self._thread = threading.Thread(target=self._run, name='bet-writer', daemon=True)
+        self._thread.start()
+
+    def submit(self, func, *args):
+        """Queue func(db, conn, *args); returns a Future with its result once committed."""
+        future = Future()
+        self._queue.put((func, args, future))
+        return future
+
+    def _take_group(self):
+        group = [self._queue.get()]
+        deadline = time.monotonic() + WRITE_BATCH_WAIT_MS / 1000
+        while len(group) < WRITE_BATCH_SIZE:
+            try:
+                group.append(self._queue.get(timeout=max(deadline - time.monotonic(), 0)))
+            except queue.Empty:
+                break
+        return group
+
+    def _run(self):
+        while True:
+            group = self._take_group()
+            try:
+                # Outside the group's transaction: the first check opens its own
+                prepare(self.db)
+            except Exception as e:
+                for _, _, future in group:
+                    future.set_exception(e)
+                continue
+            self._commit(group)
+
+    def _commit(self, group):
+        """Run a group of writes in one transaction.
+
+        The first write runs as is, the rest each in a savepoint. A write
+        that fails is undone on its own; unless it was running alone, it is
+        tried again alone after the commit, so only its own error is reported
+        (e.g. a bet in a closed season).
+        """
+        done = []
+        retry = []
+        try:
+            with self.db.connection() as conn:
+                for func, args, future in group:
+                    if not done:
+                        try:
+                            done.append((future, func(self.db, conn, *args)))
+                        except Exception as e:
+                            conn.rollback()
+                            if len(group) == 1:
+                                future.set_exception(e)
+                            else:
+                                retry.append((func, args, future))
+                        continue
+                    c = conn.cursor()
+                    c.execute('SAVEPOINT bet_write')
+                    try:
+                        result = func(self.db, conn, *args)
+                    except Exception:
+                        c.execute('ROLLBACK TO SAVEPOINT bet_write')
+                        retry.append((func, args, future))
+                    else:
+                        done.append((future, result))
+                    c.execute('RELEASE SAVEPOINT bet_write')
+        except Exception as e:
+            # The transaction failed (a savepoint, the connection or the
+            # commit), so none of the group was written: fail every write that
+            # hasn't been answered or queued to run again, not just the ones run
+            retrying = {future for _, _, future in retry}
+            for _, _, future in group:
+                if not future.done() and future not in retrying:
+                    future.set_exception(e)
+        else:
+            self.groups += 1
+            self.writes += len(done)
+            for future, result in done:
+                future.set_result(result)
+        for job in retry:
+            self._commit([job])
+
+
+def get_writer(db):
+    """Return the writer thread for db, starting it on first use."""
+    with _writers_lock:
+        writer = _writers.get(db.url)
+        if writer is None:
+            writer = _writers[db.url] = BetWriter(db)
+        return writer
+
+
+def writer_stats():
+    """Groups committed, writes in them and writes still queued, per database."""
+    with _writers_lock:
+        writers = list(_writers.values())
+    return [{'database': w.db.url.split('@')[-1], 'groups': w.groups, 'writes': w.writes,
+             'per group': round(w.writes / w.groups, 1) if w.groups else 0, 'queued': w._queue.qsize()}
+            for w in writers]
+
+
+def write(db, func, *args, timeout=WRITE_TIMEOUT):
+    """Run func(db, conn, *args) on db's writer thread and return its result once it has committed.
+
+    Raises whatever func raised, or TimeoutError if the write isn't confirmed in time.
+    """
+    return get_writer(db).submit(func, *args).result(timeout=timeout)